@@ -0,0 +1,66 @@
+# backend/bench_clustering.py
+"""
+Benchmark cluster_pois against the previous sklearn KMeans path on synthetic cities.
+
+Usage: python bench_clustering.py [repeats]
+"""
+import sys
+import time
+import numpy as np
+from components.clustering import cluster_pois
+
+CITY_CENTER = (48.8566, 2.3522)  # Paris
+CASES = [(5, 3), (10, 3), (20, 3), (20, 5), (50, 7)]  # (POIs, days)
+
+
+def synthetic_pois(n, seed=0):
+    rng = np.random.default_rng(seed)
+    coords = rng.normal(CITY_CENTER, 0.03, size=(n, 2))
+    return [{"name": f"POI {i}", "lat": float(lat), "lon": float(lon)} for i, (lat, lon) in enumerate(coords)]
+
+
+def time_call(fn, repeats):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    return (time.perf_counter() - start) / repeats * 1e6, result
+
+
+def kmeans_clusters(pois, days):
+    from sklearn.cluster import KMeans
+    coords = np.array([[poi["lat"], poi["lon"]] for poi in pois])
+    k = min(days, len(pois))
+    labels = KMeans(n_clusters=k, random_state=42).fit_predict(coords)
+    clusters = [[] for _ in range(k)]
+    for poi, label in zip(pois, labels):
+        clusters[label].append(poi)
+    return clusters
+
+
+def sizes(clusters):
+    return "/".join(str(len(cluster)) for cluster in clusters)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    try:
+        import sklearn  # noqa: F401
+        have_sklearn = True
+    except ImportError:
+        have_sklearn = False
+        print("scikit-learn not installed, skipping the KMeans baseline")
+
+    print(f"{'POIs':>5} {'days':>5} {'balanced (us)':>14} {'sizes':>14} {'KMeans (us)':>12} {'sizes':>14}")
+    for n, days in CASES:
+        pois = synthetic_pois(n)
+        ours_us, ours = time_call(lambda: cluster_pois(pois, days), repeats)
+        line = f"{n:>5} {days:>5} {ours_us:>14.1f} {sizes(ours):>14}"
+        if have_sklearn:
+            kmeans_us, theirs = time_call(lambda: kmeans_clusters(pois, days), max(1, repeats // 20))
+            line += f" {kmeans_us:>12.1f} {sizes(theirs):>14}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
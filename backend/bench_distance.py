@@ -0,0 +1,67 @@
+# backend/bench_distance.py
+"""
+Benchmark the vectorized distance API in components/distance.py against scalar haversine_distance loops.
+
+Usage: python bench_distance.py [repeats]
+"""
+import sys
+import time
+import numpy as np
+from components.distance import haversine_distance, haversine_matrix, haversine_condensed, haversine_to_many, k_nearest
+
+CITY_CENTER = (48.8566, 2.3522)  # Paris
+SIZES = [10, 50, 200, 1000]
+
+
+def time_call(fn, repeats):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    return (time.perf_counter() - start) / repeats * 1e6, result
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = np.random.default_rng(0)
+
+    print(f"{'N':>6} {'case':>12} {'scalar (us)':>12} {'float64 (us)':>13} {'float32 (us)':>13} {'max err (m)':>12}")
+    for n in SIZES:
+        coords = rng.normal(CITY_CENTER, 0.05, size=(n, 2))
+        lats, lons = coords[:, 0], coords[:, 1]
+        lat_list, lon_list = lats.tolist(), lons.tolist()
+        scalar_repeats = max(1, repeats // max(1, n // 50))
+
+        # Full pairwise matrix
+        scalar_us, expected = time_call(
+            lambda: [[haversine_distance(a, b, c, d) for c, d in zip(lat_list, lon_list)] for a, b in zip(lat_list, lon_list)],
+            scalar_repeats
+        )
+        vec_us, result = time_call(lambda: haversine_matrix(lats, lons), repeats)
+        f32_us, result32 = time_call(lambda: haversine_matrix(lats, lons, dtype=np.float32), repeats)
+        err = max(np.abs(result - np.array(expected)).max(), np.abs(result32 - np.array(expected)).max()) * 1000
+        print(f"{n:>6} {'matrix':>12} {scalar_us:>12.1f} {vec_us:>13.1f} {f32_us:>13.1f} {err:>12.3f}")
+
+        condensed_us, _ = time_call(lambda: haversine_condensed(lats, lons), repeats)
+        print(f"{n:>6} {'condensed':>12} {'':>12} {condensed_us:>13.1f}")
+
+        # One point to all points, and its k nearest
+        scalar_us, expected = time_call(
+            lambda: [haversine_distance(lat_list[0], lon_list[0], c, d) for c, d in zip(lat_list, lon_list)],
+            repeats
+        )
+        vec_us, result = time_call(lambda: haversine_to_many(lats[0], lons[0], lats, lons), repeats)
+        f32_us, result32 = time_call(lambda: haversine_to_many(lats[0], lons[0], lats, lons, dtype=np.float32), repeats)
+        err = max(np.abs(result - np.array(expected)).max(), np.abs(result32 - np.array(expected)).max()) * 1000
+        print(f"{n:>6} {'one-to-many':>12} {scalar_us:>12.1f} {vec_us:>13.1f} {f32_us:>13.1f} {err:>12.3f}")
+
+        scalar_us, _ = time_call(
+            lambda: sorted(range(n), key=lambda i: haversine_distance(lat_list[0], lon_list[0], lat_list[i], lon_list[i]))[:10],
+            repeats
+        )
+        vec_us, _ = time_call(lambda: k_nearest(lats[0], lons[0], lats, lons, 10), repeats)
+        print(f"{n:>6} {'k-nearest':>12} {scalar_us:>12.1f} {vec_us:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
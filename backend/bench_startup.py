@@ -0,0 +1,55 @@
+# backend/bench_startup.py
+"""
+Report the cold-start cost of the backend: total time to import main.py and the
+time spent in each package's own modules (from `python -X importtime`).
+
+Usage: python bench_startup.py [module] [top]
+"""
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+
+
+def run_import(module: str, importtime: bool = False):
+    args = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", f"import {module}"]
+    start = time.perf_counter()
+    result = subprocess.run(args, cwd=BACKEND_DIR, capture_output=True, text=True, env=os.environ.copy())
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return elapsed, result.stderr
+
+
+def import_costs(stderr: str) -> dict:
+    """Microseconds spent importing each top-level package (its own modules only), from -X importtime output."""
+    costs = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        costs[name.strip().split(".")[0]] += int(self_us)
+    return costs
+
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else "main"
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+
+    baseline, _ = run_import("sys")
+    elapsed, _ = run_import(module)
+    _, stderr = run_import(module, importtime=True)
+    costs = import_costs(stderr)
+
+    print(f"python -c 'import {module}': {elapsed * 1000:.0f} ms ({(elapsed - baseline) * 1000:.0f} ms over a bare interpreter)")
+    print(f"{'package':<30} {'self (ms)':>16}")
+    for name, cost in sorted(costs.items(), key=lambda item: -item[1])[:top]:
+        print(f"{name:<30} {cost / 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
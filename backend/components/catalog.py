@@ -0,0 +1,81 @@
+# backend/components/catalog.py
+import hashlib
+import json
+import logging
+import os
+import time
+from components.cache import LRUCache
+from components.scoring import POIScorer
+from components.spatial import SpatialIndex
+from components.metrics import register_cache
+
+
+class POICatalog:
+    """A city's de-duplicated POIs together with the structures derived from them."""
+
+    def __init__(self, city: str, pois: list, source_version: int = None):
+        self.city = city
+        self.pois = pois
+        self.scorer = POIScorer(pois)
+        self.version = catalog_version(pois)
+        # The city's poi_versions counter when the POIs were read, and when it was last compared
+        self.source_version = source_version
+        self.checked_at = time.monotonic()
+        self._spatial = None
+
+    @property
+    def spatial(self) -> SpatialIndex:
+        """Grid index over the POIs' locations, built on first use."""
+        if self._spatial is None:
+            self._spatial = SpatialIndex([poi["lat"] for poi in self.pois], [poi["lon"] for poi in self.pois])
+        return self._spatial
+
+    def __len__(self):
+        return len(self.pois)
+
+
+def catalog_version(pois: list) -> str:
+    """Content hash of a catalog; changes whenever a POI's name, interests or location changes."""
+    digest = hashlib.sha1()
+    for poi in pois:
+        digest.update(json.dumps(
+            [poi.get("name"), poi.get("interests"), poi.get("lat"), poi.get("lon")],
+            sort_keys=True, default=str
+        ).encode())
+    return digest.hexdigest()[:16]
+
+
+# Per-city catalog cache, bounded in bytes so memory stays flat however many cities are hot
+poi_catalog_cache = LRUCache(
+    max_bytes=int(os.getenv("POI_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    ttl=float(os.getenv("POI_CACHE_TTL_SECONDS", 3600))
+)
+register_cache("poi_catalog", poi_catalog_cache)
+
+# How often a cached catalog is compared against the city's poi_versions counter, which
+# the re-tag and seed scripts bump; this bounds how long a worker serves old POIs
+POI_VERSION_CHECK_SECONDS = float(os.getenv("POI_VERSION_CHECK_SECONDS", 5))
+
+
+def get_cached_catalog(city_iata: str):
+    return poi_catalog_cache.get(city_iata)
+
+
+def cache_catalog(city_iata: str, pois: list, source_version: int = None) -> POICatalog:
+    catalog = POICatalog(city_iata, pois, source_version)
+    if not poi_catalog_cache.set(city_iata, catalog):
+        logging.warning(f"POI catalog for {city_iata} exceeds the cache budget, not caching")
+    return catalog
+
+
+def invalidate_catalog(city_iata: str = None):
+    """Drop one city's cached catalog, or every city's when no city is given."""
+    if city_iata is None:
+        poi_catalog_cache.clear()
+        logging.info("Invalidated all cached POI catalogs")
+    elif poi_catalog_cache.invalidate(city_iata):
+        logging.info(f"Invalidated cached POI catalog for {city_iata}")
+
+
+def needs_version_check(catalog: POICatalog) -> bool:
+    return time.monotonic() - catalog.checked_at >= POI_VERSION_CHECK_SECONDS
@@ -0,0 +1,41 @@
+# backend/components/clients.py
+import logging
+import os
+import threading
+
+# Third-party SDK clients are built on first use rather than at import, so the app
+# starts serving without paying for SDK imports (google.generativeai takes
+# close to a second) or failing on a missing credential it may never need.
+_lock = threading.Lock()
+_amadeus = None
+_genai = None
+
+
+def get_amadeus():
+    """The shared Amadeus client (hotel list and hotel search)."""
+    global _amadeus
+    if _amadeus is None:
+        with _lock:
+            if _amadeus is None:
+                from amadeus import Client
+                _amadeus = Client(
+                    client_id=os.getenv("AMADEUS_API_KEY"),
+                    client_secret=os.getenv("AMADEUS_API_SECRET"),
+                    hostname="test"
+                )
+                logging.info("Initialized Amadeus client")
+    return _amadeus
+
+
+def get_genai():
+    """The google.generativeai module, configured with GEMINI_API_KEY."""
+    global _genai
+    if _genai is None:
+        with _lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                _genai = genai
+                logging.info("Initialized Gemini client")
+    return _genai
+
@@ -1,52 +1,175 @@
 # components/clustering.py
-from sklearn.cluster import KMeans
 import numpy as np
 import logging
+from components.distance import EARTH_RADIUS_KM, haversine_matrix
 
-def cluster_pois(pois, days):
+MAX_ITERATIONS = 20
+METRICS = ("projected", "haversine")
+
+
+def project_coords(lat, lon) -> np.ndarray:
+    """
+    Project lat/lon (degrees) to an equirectangular plane in km, centred on the points.
+
+    Over a single city the distortion is negligible, so Euclidean distance on the
+    result is a good stand-in for great-circle distance.
+    """
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    lat0 = lat.mean()
+    x = (lon - lon.mean()) * np.cos(lat0) * EARTH_RADIUS_KM
+    y = (lat - lat0) * EARTH_RADIUS_KM
+    return np.column_stack((x, y))
+
+
+def _distances(points: np.ndarray, centers: np.ndarray, metric: str) -> np.ndarray:
+    if metric == "haversine":
+        return haversine_matrix(points[:, 0], points[:, 1], centers[:, 0], centers[:, 1])
+    diff = points[:, None, :] - centers[None, :, :]
+    return np.sqrt((diff ** 2).sum(axis=2))
+
+
+def _farthest_point_seeds(points: np.ndarray, k: int, metric: str) -> np.ndarray:
+    """Deterministic seeding: the point farthest from the centroid, then repeatedly the point farthest from all seeds."""
+    first = int(np.argmax(_distances(points, points.mean(axis=0, keepdims=True), metric)[:, 0]))
+    seeds = [first]
+    nearest = _distances(points, points[[first]], metric)[:, 0]
+    for _ in range(1, k):
+        nxt = int(np.argmax(nearest))
+        seeds.append(nxt)
+        nearest = np.minimum(nearest, _distances(points, points[[nxt]], metric)[:, 0])
+    return points[seeds].copy()
+
+
+def _assign(dist: np.ndarray, capacity) -> np.ndarray:
     """
-    Cluster POIs into groups for each day using KMeans clustering based on lat/lon.
-    
+    Assign each point to its nearest center that still has room.
+
+    With `capacity=None` the sizes are balanced exactly (they differ by at most one);
+    otherwise each center takes at most `capacity` points. Points with the most to
+    lose from not getting their first choice (largest regret) are placed first.
+    """
+    n, k = dist.shape
+    preferences = np.argsort(dist, axis=1, kind="stable")
+    if k > 1:
+        ranked = np.take_along_axis(dist, preferences[:, :2], axis=1)
+        regret = ranked[:, 1] - ranked[:, 0]
+    else:
+        regret = np.zeros(n)
+    order = np.argsort(-regret, kind="stable")
+
+    counts = [0] * k
+    if capacity is None:
+        base, extra = divmod(n, k)  # `extra` centers may take base + 1 points
+    else:
+        base, extra = capacity, 0
+    labels = np.empty(n, dtype=np.intp)
+    preferences = preferences.tolist()
+    for i in order.tolist():
+        for c in preferences[i]:
+            if counts[c] < base:
+                break
+            if counts[c] == base and extra > 0:
+                extra -= 1
+                break
+        counts[c] += 1
+        labels[i] = c
+    return labels
+
+
+def cluster_labels(coords: np.ndarray, k: int, balanced: bool = True, capacity=None, metric: str = "projected") -> np.ndarray:
+    """
+    Partition (n, 2) [lat, lon] coordinates into k groups; returns one label in [0, k) per row.
+
+    Farthest-point seeding followed by Lloyd iterations, where the assignment step
+    respects the capacity in balanced mode. Same input, same labels.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}. Must be one of {METRICS}")
+    n = len(coords)
+    if k <= 1:
+        return np.zeros(n, dtype=np.intp)
+    if n <= k:
+        return np.arange(n, dtype=np.intp)
+
+    points = project_coords(coords[:, 0], coords[:, 1]) if metric == "projected" else np.asarray(coords, dtype=np.float64)
+    if not balanced:
+        capacity = n
+    elif capacity is not None and capacity * k < n:
+        logging.warning(f"Capacity {capacity} cannot fit {n} POIs into {k} days, balancing exactly instead")
+        capacity = None
+
+    centers = _farthest_point_seeds(points, k, metric)
+    labels = None
+    best_cost = np.inf
+    rows = np.arange(n)
+    for _ in range(MAX_ITERATIONS):
+        dist = _distances(points, centers, metric)
+        new_labels = _assign(dist, capacity)
+        # Capacity-constrained assignment can cycle, so stop as soon as it stops improving
+        cost = dist[rows, new_labels].sum()
+        if labels is not None and cost >= best_cost:
+            break
+        labels, best_cost = new_labels, cost
+        counts = np.bincount(labels, minlength=k)
+        filled = counts > 0
+        for dim in range(points.shape[1]):
+            sums = np.bincount(labels, weights=points[:, dim], minlength=k)
+            centers[filled, dim] = sums[filled] / counts[filled]
+    return labels
+
+
+def cluster_pois(pois, days, balanced=True, capacity=None, metric="projected"):
+    """
+    Cluster POIs into groups for each day by location.
+
     Args:
         pois (list): List of POIs, each with 'lat' and 'lon' fields.
         days (int): Number of days to cluster POIs into.
-    
+        balanced (bool): Keep the number of POIs per day even (sizes differ by at most one).
+        capacity (int): Optional maximum number of POIs per day instead of exact balancing.
+        metric (str): "projected" (equirectangular km) or "haversine" distances.
+
     Returns:
-        list: List of clusters, where each cluster is a list of POIs for a day.
+        list: List of clusters, where each cluster is a list of POIs for a day. POIs keep
+        their input order within a day, and days are ordered by their best-ranked POI.
+        With fewer POIs than days, each POI gets its own day and the remaining days are empty.
     """
     if not pois:
         return [[] for _ in range(days)]
 
-    # Remove duplicates based on POI name (just in case)
+    pois = unique_pois(pois)
+    labels = cluster_labels(poi_coords(pois), min(days, len(pois)), balanced=balanced, capacity=capacity, metric=metric)
+    return group_clusters(pois, labels, days)
+
+
+def unique_pois(pois: list) -> list:
+    """Drop POIs whose name was already seen (just in case), keeping the first."""
     seen_names = set()
-    unique_pois = []
+    unique = []
     for poi in pois:
         if poi["name"] not in seen_names:
             seen_names.add(poi["name"])
-            unique_pois.append(poi)
+            unique.append(poi)
         else:
             logging.warning(f"Duplicate POI found before clustering: {poi['name']}")
-    pois = unique_pois
-
-    # Extract coordinates for clustering
-    coords = np.array([[poi["lat"], poi["lon"]] for poi in pois])
-    
-    # Use KMeans to cluster POIs into 'days' clusters
-    kmeans = KMeans(n_clusters=min(days, len(pois)), random_state=42)
-    labels = kmeans.fit_predict(coords)
-    
-    # Group POIs by cluster, ensuring no duplicates
-    clusters = [[] for _ in range(min(days, len(pois)))]
-    assigned_pois = set()
-    for poi, label in zip(pois, labels):
-        if poi["name"] not in assigned_pois:
-            clusters[label].append(poi)
-            assigned_pois.add(poi["name"])
-        else:
-            logging.warning(f"POI {poi['name']} was assigned to multiple clusters. Skipping duplicate assignment.")
-    
+    return unique
+
+
+def poi_coords(pois: list) -> np.ndarray:
+    """The (n, 2) [lat, lon] array cluster_labels takes."""
+    return np.array([[poi["lat"], poi["lon"]] for poi in pois], dtype=np.float64).reshape(-1, 2)
+
+
+def group_clusters(pois: list, labels, days: int) -> list:
+    """Group POIs by label in input order, so clusters come out in order of first appearance, padded to `days`."""
+    grouped = {}
+    for poi, label in zip(pois, np.asarray(labels).tolist()):
+        grouped.setdefault(label, []).append(poi)
+    clusters = list(grouped.values())
+
     # Ensure we have exactly 'days' clusters (pad with empty lists if needed)
     while len(clusters) < days:
         clusters.append([])
-    
-    return clusters
\ No newline at end of file
+
+    return clusters
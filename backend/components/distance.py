@@ -1,11 +1,15 @@
 # backend/components/distance.py
 import math
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate the great-circle distance between two points on Earth (in kilometers)."""
     if not all(isinstance(x, (int, float)) for x in [lat1, lon1, lat2, lon2]):
         raise ValueError("Latitude and longitude must be numeric values")
-    R = 6371.0
+    R = EARTH_RADIUS_KM
     lat1_rad = math.radians(lat1)
     lon1_rad = math.radians(lon1)
     lat2_rad = math.radians(lat2)
@@ -15,4 +19,66 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     distance = R * c
-    return distance
\ No newline at end of file
+    return distance
+
+
+# Vectorized API: lat/lon in degrees as scalars or 1-d array-likes, kilometers out as
+# NumPy arrays, computed in `dtype` (float64 or float32).
+
+def _radians(values, dtype) -> np.ndarray:
+    return np.radians(np.atleast_1d(np.asarray(values, dtype=dtype)))
+
+
+def _haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distances between broadcastable arrays of radians."""
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return (2 * EARTH_RADIUS_KM) * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def haversine_matrix(lats, lons, other_lats=None, other_lons=None, dtype=np.float64) -> np.ndarray:
+    """
+    Pairwise distances: (n, n) between the given points, or (n, m) against `other_lats`/`other_lons`.
+
+    A scalar counts as one point; haversine_to_many is the (n,) form of that case.
+    """
+    lat = _radians(lats, dtype)
+    lon = _radians(lons, dtype)
+    if other_lats is None:
+        other_lat, other_lon = lat, lon
+    else:
+        other_lat = _radians(other_lats, dtype)
+        other_lon = _radians(other_lons, dtype)
+    return _haversine(lat[:, None], lon[:, None], other_lat[None, :], other_lon[None, :])
+
+
+def haversine_condensed(lats, lons, dtype=np.float64) -> np.ndarray:
+    """
+    Distances between every pair i < j, in the row-major order of scipy's pdist.
+
+    Computes each pair once, n * (n - 1) / 2 values instead of the full n * n matrix.
+    """
+    lat = _radians(lats, dtype)
+    lon = _radians(lons, dtype)
+    i, j = np.triu_indices(len(lat), k=1)
+    return _haversine(lat[i], lon[i], lat[j], lon[j])
+
+
+def haversine_to_many(lat, lon, lats, lons, dtype=np.float64) -> np.ndarray:
+    """Distances from one point to each of the given points, as an (n,) array."""
+    return _haversine(_radians(lat, dtype), _radians(lon, dtype), _radians(lats, dtype), _radians(lons, dtype))
+
+
+def k_nearest(lat, lon, lats, lons, k: int, dtype=np.float64):
+    """
+    The k points closest to (lat, lon).
+
+    Returns:
+        tuple: (indices, distances), nearest first. Fewer than k when there are fewer points.
+    """
+    distances = haversine_to_many(lat, lon, lats, lons, dtype=dtype)
+    k = min(k, len(distances))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=distances.dtype)
+    nearest = np.argpartition(distances, k - 1)[:k]
+    nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+    return nearest, distances[nearest]
@@ -0,0 +1,113 @@
+# backend/components/executor.py
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from components.metrics import FALLBACKS
+
+EXECUTOR_KINDS = ("process", "thread", "inline")
+
+
+def _cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+def _default_workers() -> int:
+    # Every uvicorn worker gets its own pool, so split the cores between them.
+    # WEB_CONCURRENCY is what uvicorn reads as its default --workers.
+    return max(1, _cores() // max(1, int(os.getenv("WEB_CONCURRENCY", 1))))
+
+
+# CPU-bound planning work (scoring, clustering, routing) runs on this executor instead
+# of the event loop thread. Work smaller than PLAN_EXECUTOR_MIN_SIZE items stays
+# inline, where it is cheaper than the hand-off.
+PLAN_EXECUTOR = os.getenv("PLAN_EXECUTOR", "process").lower()
+PLAN_EXECUTOR_WORKERS = int(os.getenv("PLAN_EXECUTOR_WORKERS", 0)) or _default_workers()
+PLAN_EXECUTOR_MIN_SIZE = int(os.getenv("PLAN_EXECUTOR_MIN_SIZE", 100))
+
+
+# Set for requests that must run their CPU work on the calling thread, e.g. profiled ones
+_force_inline: ContextVar = ContextVar("force_inline", default=False)
+
+
+@contextmanager
+def inline_execution():
+    """Run every run_cpu call in the enclosed block (and tasks it starts) inline."""
+    token = _force_inline.set(True)
+    try:
+        yield
+    finally:
+        _force_inline.reset(token)
+
+
+class PlanExecutor:
+    """
+    Runs CPU-bound functions on a process or thread pool, created on first use.
+
+    With processes the function and its arguments are pickled, so callers pass
+    top-level functions and NumPy arrays rather than POI documents. A broken process
+    pool (e.g. a worker killed by the OOM killer) is replaced, and the call runs inline.
+    """
+
+    def __init__(self, kind: str, workers: int, min_size: int):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown PLAN_EXECUTOR: {kind}. Must be one of {EXECUTOR_KINDS}")
+        self.kind = kind
+        self.workers = workers
+        self.min_size = min_size
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                if self.kind == "process":
+                    # spawn rather than fork: forking would copy the Motor and loop watchdog threads' state mid-flight
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+                else:
+                    self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="plan-cpu")
+                logging.info(f"Started plan executor with {self.workers} {self.kind} worker(s)")
+            return self._pool
+
+    async def run(self, fn, *args, size: int = None, min_size: int = None, **kwargs):
+        """Run `fn(*args, **kwargs)` on the pool, or inline when `size` is below `min_size` (default: the executor's)."""
+        call = functools.partial(fn, *args, **kwargs)
+        min_size = self.min_size if min_size is None else min_size
+        if self.kind == "inline" or _force_inline.get() or (size is not None and size < min_size):
+            return call()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_pool(), call)
+        except BrokenProcessPool as e:
+            logging.error(f"Plan executor pool broke, running {fn.__name__} inline: {str(e)}")
+            FALLBACKS.labels("executor_inline").inc()
+            self.shutdown(wait=False)
+            return call()
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+plan_executor = PlanExecutor(PLAN_EXECUTOR, PLAN_EXECUTOR_WORKERS, PLAN_EXECUTOR_MIN_SIZE)
+
+
+async def run_cpu(fn, *args, size: int = None, min_size: int = None, **kwargs):
+    """
+    Run a CPU-bound function on the plan executor.
+
+    `size` (e.g. the number of POIs) decides whether the work is worth offloading;
+    work that is much cheaper per item than clustering can pass its own `min_size`.
+    """
+    return await plan_executor.run(fn, *args, size=size, min_size=min_size, **kwargs)
@@ -0,0 +1,226 @@
+# backend/components/hotels.py
+import asyncio
+import logging
+import os
+import time
+import numpy as np
+from amadeus import ResponseError
+from components.cache import LRUCache
+from components import repository
+from components.clients import get_amadeus
+from components.metrics import stage_timer, register_cache, EXTERNAL_ERRORS
+
+# Hotel lists per city barely change: serve them fresh for a week, then stale for
+# another week while a background refresh runs
+HOTEL_LIST_TTL = float(os.getenv("HOTEL_LIST_TTL_SECONDS", 7 * 24 * 3600))
+HOTEL_LIST_STALE_TTL = float(os.getenv("HOTEL_LIST_STALE_SECONDS", 7 * 24 * 3600))
+
+hotel_list_cache = LRUCache(
+    max_bytes=int(os.getenv("HOTEL_LIST_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+    ttl=HOTEL_LIST_TTL + HOTEL_LIST_STALE_TTL
+)
+_hotel_list_fetches = {}  # key -> in-flight fetch task
+
+# Offers change with availability, so they are only reused for a few minutes
+HOTEL_OFFERS_TTL = float(os.getenv("HOTEL_OFFERS_TTL_SECONDS", 300))
+
+hotel_offers_cache = LRUCache(
+    max_bytes=int(os.getenv("HOTEL_OFFERS_CACHE_MAX_BYTES", 16 * 1024 * 1024)),
+    ttl=HOTEL_OFFERS_TTL
+)
+_MISSING = object()
+
+register_cache("hotel_list", hotel_list_cache)
+register_cache("hotel_offers", hotel_offers_cache)
+
+# Hotel match score: higher rating is better, lower price is better
+HOTEL_RATING_WEIGHT = 100
+HOTEL_PRICE_WEIGHT = 0.1
+HOTEL_OFFERS_BATCH_SIZE = 10  # Maximum number of hotel IDs per Hotel Search API call
+
+
+def hotel_list_key(city_code: str, ratings=None) -> str:
+    return f"{city_code}:{','.join(sorted(ratings))}" if ratings else city_code
+
+
+async def _fetch_hotel_list(key: str, city_code: str, ratings) -> list:
+    params = {"cityCode": city_code}
+    if ratings:
+        params["ratings"] = list(ratings)
+    # The Amadeus SDK is synchronous, so keep it off the event loop
+    try:
+        with stage_timer("amadeus_list"):
+            response = await asyncio.to_thread(get_amadeus().reference_data.locations.hotels.by_city.get, **params)
+    except ResponseError:
+        EXTERNAL_ERRORS.labels("amadeus").inc()
+        raise
+    hotels = response.data or []
+    fetched_at = time.time()
+    hotel_list_cache.set(key, (fetched_at, hotels))
+    try:
+        await repository.save_hotel_list(key, hotels, fetched_at)
+    except Exception as e:
+        logging.error(f"Failed to persist hotel list for {key}: {str(e)}")
+    logging.info(f"Fetched {len(hotels)} hotels for {key} from Amadeus Hotel List API")
+    return hotels
+
+
+def _start_fetch(key: str, city_code: str, ratings) -> asyncio.Task:
+    """Start a hotel list fetch, or join the one already running for this key."""
+    task = _hotel_list_fetches.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_hotel_list(key, city_code, ratings))
+        _hotel_list_fetches[key] = task
+
+        def done(task):
+            _hotel_list_fetches.pop(key, None)
+            if not task.cancelled() and task.exception() is not None:
+                logging.error(f"Hotel list fetch for {key} failed: {task.exception()}")
+
+        task.add_done_callback(done)
+    return task
+
+
+async def _load_persisted_hotel_list(key: str):
+    try:
+        doc = await repository.find_hotel_list(key)
+    except Exception as e:
+        logging.error(f"Failed to load persisted hotel list for {key}: {str(e)}")
+        return None
+    if not doc:
+        return None
+    entry = (doc["fetched_at"], doc["hotels"])
+    remaining = HOTEL_LIST_TTL + HOTEL_LIST_STALE_TTL - (time.time() - doc["fetched_at"])
+    if remaining <= 0:
+        return None
+    hotel_list_cache.set(key, entry, ttl=remaining)
+    return entry
+
+
+async def get_city_hotels(city_code: str, ratings=None) -> list:
+    """
+    Hotels for a city from the Amadeus Hotel List API, cached per city code and rating filter.
+
+    Lookups go to memory first, then to the copy persisted in Mongo, and only then
+    to Amadeus. Stale entries are returned immediately while a refresh runs in the
+    background. Amadeus errors propagate only when there is nothing cached to serve.
+    """
+    key = hotel_list_key(city_code, ratings)
+    entry = hotel_list_cache.get(key)
+    if entry is None:
+        entry = await _load_persisted_hotel_list(key)
+
+    if entry is not None:
+        fetched_at, hotels = entry
+        if time.time() - fetched_at >= HOTEL_LIST_TTL:
+            logging.info(f"Serving stale hotel list for {key} while refreshing")
+            _start_fetch(key, city_code, ratings)
+        return hotels
+
+    return await asyncio.shield(_start_fetch(key, city_code, ratings))
+
+
+def hotel_offer_key(hotel_id: str, check_in: str, check_out: str, adults: int, currency: str) -> tuple:
+    return (hotel_id, check_in, check_out, adults, currency)
+
+
+async def get_hotel_offers(hotel_ids: list, check_in: str, check_out: str, adults: int = 2, currency: str = "USD") -> list:
+    """
+    Offers from the Amadeus Hotel Search API for the given hotels and stay.
+
+    Offers are cached per hotel, so only the hotel IDs without a cached answer are
+    sent to Amadeus. Hotels that returned no offer are cached as such too. The
+    result keeps the order of `hotel_ids` and leaves out hotels without offers.
+    """
+    results = {}
+    missing = []
+    for hotel_id in hotel_ids:
+        cached = hotel_offers_cache.get(hotel_offer_key(hotel_id, check_in, check_out, adults, currency), _MISSING)
+        if cached is _MISSING:
+            missing.append(hotel_id)
+        else:
+            results[hotel_id] = cached
+
+    if missing:
+        logging.info(f"Hotel offers cache: {len(results)} hit(s), fetching {len(missing)} hotel(s) from Amadeus")
+        try:
+            with stage_timer("amadeus_offers"):
+                response = await asyncio.to_thread(
+                    get_amadeus().shopping.hotel_offers_search.get,
+                    hotelIds=",".join(missing),
+                    checkInDate=check_in,
+                    checkOutDate=check_out,
+                    adults=adults,
+                    currency=currency
+                )
+        except ResponseError:
+            EXTERNAL_ERRORS.labels("amadeus").inc()
+            raise
+        fetched = {item.get("hotel", {}).get("hotelId"): item for item in response.data or []}
+        for hotel_id in missing:
+            offer = fetched.get(hotel_id)
+            hotel_offers_cache.set(hotel_offer_key(hotel_id, check_in, check_out, adults, currency), offer)
+            results[hotel_id] = offer
+
+    return [results[hotel_id] for hotel_id in hotel_ids if results.get(hotel_id) is not None]
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("inf")
+
+
+async def rank_hotels(hotels_list: list, check_in: str, check_out: str, k: int = 3, pool_size: int = 50,
+                      max_concurrency: int = 4, adults: int = 2, currency: str = "USD") -> list:
+    """
+    Return the k best hotels with offers among the first `pool_size` hotels of a hotel list.
+
+    Offers are fetched in batches of HOTEL_OFFERS_BATCH_SIZE, at most `max_concurrency`
+    at a time; a failing batch is skipped. Every hotel with an offer is then scored in
+    one vectorized pass (rating * 100 - price * 0.1) and the true top k is returned,
+    best first, as dicts with 'name', 'price', 'rating' and 'score'.
+    """
+    hotel_ratings_map = {hotel["hotelId"]: hotel.get("rating", 0) for hotel in hotels_list}
+    hotel_ids = [hotel["hotelId"] for hotel in hotels_list[:pool_size]]
+    batches = [hotel_ids[i:i + HOTEL_OFFERS_BATCH_SIZE] for i in range(0, len(hotel_ids), HOTEL_OFFERS_BATCH_SIZE)]
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(batch_ids):
+        async with semaphore:
+            try:
+                return await get_hotel_offers(batch_ids, check_in, check_out, adults=adults, currency=currency)
+            except ResponseError as e:
+                logging.error(f"Amadeus Hotel Search API error: {str(e)}")
+                logging.error(f"Error details: {e.response.body if e.response else 'No response body'}")
+                return []
+
+    results = await asyncio.gather(*(fetch(batch_ids) for batch_ids in batches))
+    offers = [hotel for batch in results for hotel in batch]
+    logging.info(f"Found offers for {len(offers)} of {len(hotel_ids)} candidate hotels")
+    if not offers:
+        return []
+
+    hotel_infos = [hotel.get("hotel", {}) for hotel in offers]
+    prices = [(hotel.get("offers") or [{}])[0].get("price", {}).get("total", "N/A") for hotel in offers]
+    ratings = [hotel_ratings_map.get(info.get("hotelId"), 0) for info in hotel_infos]
+
+    # Missing ratings count as 0 and missing prices as infinitely expensive
+    rating_values = np.array([_to_float(rating) for rating in ratings])
+    rating_values[~np.isfinite(rating_values)] = 0.0
+    price_values = np.array([_to_float(price) for price in prices])
+    scores = rating_values * HOTEL_RATING_WEIGHT - price_values * HOTEL_PRICE_WEIGHT
+
+    k = min(k, len(offers))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return [
+        {
+            "name": hotel_infos[i].get("name", "Unknown Hotel"),
+            "price": f"${prices[i]}" if prices[i] != "N/A" else "N/A",
+            "rating": ratings[i],
+            "score": float(scores[i])
+        }
+        for i in top
+    ]
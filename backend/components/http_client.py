@@ -0,0 +1,60 @@
+# backend/components/http_client.py
+import asyncio
+import logging
+import os
+from urllib.parse import urlsplit
+import httpx
+
+# HTTP/2 needs the optional 'h2' package; fall back to HTTP/1.1 keep-alive without it
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", 10))
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 15))
+
+_client = None
+_host_limits = {}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared pooled HTTP client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+        )
+        logging.info(f"Created shared HTTP client (http2={HTTP2_AVAILABLE}, max_connections={MAX_CONNECTIONS})")
+    return _client
+
+
+def _host_limit(host: str) -> asyncio.Semaphore:
+    limit = _host_limits.get(host)
+    if limit is None:
+        limit = _host_limits[host] = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+    return limit
+
+
+async def get(url: str, params: dict = None, **kwargs) -> httpx.Response:
+    """GET through the shared client, holding at most MAX_CONNECTIONS_PER_HOST requests per host."""
+    async with _host_limit(urlsplit(url).hostname):
+        return await get_http_client().get(url, params=params, **kwargs)
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _host_limits.clear()
+        logging.info("Shared HTTP client closed")
@@ -0,0 +1,139 @@
+# backend/components/jobs.py
+import asyncio
+import itertools
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from components import repository
+from components.models import PlanRequest
+from components.pipeline import run_plan_pipeline, store_stage
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class PlanJobQueue:
+    """
+    Runs /generate-plan pipelines in the background on a bounded pool of workers.
+
+    Jobs are persisted in the Mongo plan_jobs collection with their status, current
+    stage and resulting plan_id, so they can be polled and are resumed after a
+    restart. Higher priority jobs run first; equal priorities run in submission order.
+    """
+
+    def __init__(self, workers: int, max_pending: int, stale_after: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.stale_after = stale_after
+        self._queue = None
+        self._tasks = []
+        self._order = itertools.count()
+
+    async def start(self):
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        # Resuming needs MongoDB, so it runs in the background instead of delaying startup
+        self._tasks.append(asyncio.create_task(self._resume()))
+        logging.info(f"Started {self.workers} plan job worker(s)")
+
+    async def _resume(self):
+        try:
+            resumable = await repository.find_resumable_jobs(_now() - timedelta(seconds=self.stale_after))
+            for job in resumable:
+                if job["status"] == "running":
+                    await repository.update_job(str(job["_id"]), {"status": "queued", "updated_at": _now()})
+                self._enqueue(str(job["_id"]), job["request"], job.get("priority", 0), job.get("use_cache", True))
+        except Exception as e:
+            logging.error(f"Failed to resume plan jobs: {str(e)}")
+            return
+        if resumable:
+            logging.info(f"Resumed {len(resumable)} plan job(s)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _enqueue(self, job_id: str, request: dict, priority: int, use_cache: bool):
+        self._queue.put_nowait((-priority, next(self._order), job_id, request, use_cache))
+
+    async def submit(self, request: PlanRequest, priority: int = 0, use_cache: bool = True) -> str:
+        if self._queue is None:
+            raise RuntimeError("Plan job queue is not running")
+        if self._queue.qsize() >= self.max_pending:
+            raise QueueFullError(f"Too many pending plan jobs ({self.max_pending})")
+
+        request_doc = request.model_dump()
+        now = _now()
+        job_id = await repository.insert_job({
+            "status": "queued",
+            "stage": None,
+            "request": request_doc,
+            "priority": priority,
+            "use_cache": use_cache,
+            "plan_id": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        })
+        self._enqueue(job_id, request_doc, priority, use_cache)
+        logging.info(f"Queued plan job {job_id} for {request.location} (priority {priority})")
+        return job_id
+
+    async def _worker(self, n: int):
+        while True:
+            _, _, job_id, request_doc, use_cache = await self._queue.get()
+            try:
+                await self._run(job_id, request_doc, use_cache)
+            except Exception as e:
+                logging.error(f"Plan job worker {n} failed on job {job_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, request_doc: dict, use_cache: bool):
+        claimed = await repository.claim_job(job_id, {"started_at": _now(), "updated_at": _now()})
+        if claimed is None:
+            logging.info(f"Plan job {job_id} was already taken by another worker")
+            return
+
+        async def on_event(event, data):
+            await repository.update_job(job_id, {"stage": event, "updated_at": _now()})
+
+        request = PlanRequest(**request_doc)
+        try:
+            plan_data = await run_plan_pipeline(request, use_cache=use_cache, on_event=on_event)
+            plan_id = await store_stage(request, plan_data)
+        except HTTPException as e:
+            logging.error(f"Plan job {job_id} failed: {e.detail}")
+            await repository.update_job(job_id, {
+                "status": "failed", "error": e.detail, "status_code": e.status_code,
+                "finished_at": _now(), "updated_at": _now()
+            })
+            return
+        except Exception as e:
+            logging.error(f"Plan job {job_id} failed: {str(e)}")
+            await repository.update_job(job_id, {
+                "status": "failed", "error": f"Error generating plan: {str(e)}", "status_code": 500,
+                "finished_at": _now(), "updated_at": _now()
+            })
+            return
+
+        await repository.update_job(job_id, {
+            "status": "done", "stage": "stored", "plan_id": plan_id,
+            "finished_at": _now(), "updated_at": _now()
+        })
+        logging.info(f"Plan job {job_id} finished with plan_id: {plan_id}")
+
+
+plan_jobs = PlanJobQueue(
+    workers=int(os.getenv("PLAN_JOB_WORKERS", 4)),
+    max_pending=int(os.getenv("PLAN_JOB_MAX_PENDING", 100)),
+    stale_after=float(os.getenv("PLAN_JOB_STALE_SECONDS", 600))
+)
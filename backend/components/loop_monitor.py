@@ -0,0 +1,158 @@
+# backend/components/loop_monitor.py
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from pathlib import Path
+from components.metrics import LOOP_LAG, LOOP_BLOCKS, LOOP_BLOCKED_SECONDS
+from components.timing import task_stage
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() not in ("0", "false", "no")
+LOOP_HEARTBEAT_MS = float(os.getenv("LOOP_HEARTBEAT_MS", 50))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", 100))
+LOOP_BLOCKS_KEPT = int(os.getenv("LOOP_BLOCKS_KEPT", 50))
+STACK_DEPTH = 15
+
+APP_ROOT = str(Path(__file__).parent.parent)
+
+
+def _blocking_function(stack) -> str:
+    """The innermost frame of our own code in the stack, i.e. the call that blocked the loop."""
+    for frame in reversed(stack):
+        if frame.filename.startswith(APP_ROOT) and "site-packages" not in frame.filename:
+            break
+    else:
+        if not stack:
+            return "unknown"
+        frame = stack[-1]
+    return f"{os.path.relpath(frame.filename, APP_ROOT)}:{frame.lineno} in {frame.name}"
+
+
+class LoopMonitor:
+    """
+    Detects code that blocks the event loop.
+
+    A heartbeat coroutine sleeps for `heartbeat` seconds at a time and records how late
+    it wakes up as event_loop_lag_seconds. A watchdog thread checks the heartbeat and,
+    once it is more than `threshold` seconds overdue, samples the loop thread's stack
+    and the stage_timer stage open in the running task. When the loop resumes the
+    block is counted in event_loop_blocks_total and kept for /debug/loop-blocks.
+    A single long callback and a backlog of short ones both show up as a block; the
+    stack sample tells them apart.
+    """
+
+    def __init__(self, heartbeat: float, threshold: float, kept: int, enabled: bool = True):
+        self.heartbeat = heartbeat
+        self.threshold = threshold
+        self.enabled = enabled
+        self.blocks = deque(maxlen=kept)
+        self._loop = None
+        self._loop_thread = None
+        self._task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._last_beat = 0.0
+        self._pending = None  # (beat the block started after, block record)
+
+    async def start(self):
+        if not self.enabled:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logging.info(f"Event loop monitor started (blocks over {self.threshold * 1000:.0f} ms are recorded)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._watchdog.join(timeout=1)
+        self._task = self._watchdog = None
+
+    async def _heartbeat(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.heartbeat)
+            now = time.perf_counter()
+            LOOP_LAG.observe(max(0.0, now - start - self.heartbeat))
+            with self._lock:
+                pending, self._pending = self._pending, None
+                self._last_beat = now
+            if pending is not None:
+                self._finish_block(pending, now)
+
+    def _watch(self):
+        # Runs on its own thread, so it keeps going while the loop is stuck
+        while not self._stopped.wait(min(self.heartbeat, self.threshold) / 2):
+            with self._lock:
+                last_beat = self._last_beat
+                overdue = time.perf_counter() - last_beat - self.heartbeat
+                if overdue < self.threshold or self._pending is not None:
+                    continue
+                self._pending = (last_beat, None)
+            block = self._sample(overdue)
+            with self._lock:
+                # The loop may have resumed (and cleared the block) while we sampled
+                if self._pending is not None and self._pending[0] == last_beat:
+                    self._pending = (last_beat, block)
+
+    def _sample(self, overdue: float) -> dict:
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = traceback.extract_stack(frame) if frame is not None else []
+        task = asyncio.current_task(self._loop)
+        return {
+            "detected_at": time.time(),
+            "stage": task_stage(task) if task is not None else None,
+            "function": _blocking_function(stack),
+            "task": task.get_name() if task is not None else None,
+            "blocked_ms": round(overdue * 1000, 1),
+            "stack": [line.rstrip() for line in traceback.format_list(stack[-STACK_DEPTH:])]
+        }
+
+    def _finish_block(self, pending, now: float):
+        last_beat, block = pending
+        if block is None:  # resumed before the watchdog got a sample
+            return
+        blocked = max(0.0, now - last_beat - self.heartbeat)
+        block["blocked_ms"] = round(blocked * 1000, 1)
+        stage = block["stage"] or "unknown"
+        LOOP_BLOCKS.labels(stage).inc()
+        LOOP_BLOCKED_SECONDS.labels(stage).inc(blocked)
+        self.blocks.append(block)
+        logging.warning(f"Event loop blocked for {block['blocked_ms']} ms in {block['function']} (stage: {stage})")
+
+    def report(self) -> dict:
+        """Recent blocks (newest first) and a per-function summary, worst first."""
+        blocks = list(self.blocks)[::-1]
+        summary = {}
+        for block in blocks:
+            entry = summary.setdefault(block["function"], {"function": block["function"], "stage": block["stage"], "count": 0, "max_ms": 0.0, "total_ms": 0.0})
+            entry["count"] += 1
+            entry["max_ms"] = max(entry["max_ms"], block["blocked_ms"])
+            entry["total_ms"] = round(entry["total_ms"] + block["blocked_ms"], 1)
+        return {
+            "enabled": self.enabled,
+            "heartbeat_ms": self.heartbeat * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "summary": sorted(summary.values(), key=lambda entry: entry["total_ms"], reverse=True),
+            "blocks": blocks
+        }
+
+
+loop_monitor = LoopMonitor(
+    heartbeat=LOOP_HEARTBEAT_MS / 1000,
+    threshold=LOOP_BLOCK_THRESHOLD_MS / 1000,
+    kept=LOOP_BLOCKS_KEPT,
+    enabled=LOOP_MONITOR_ENABLED
+)
@@ -0,0 +1,87 @@
+# backend/components/metrics.py
+import time
+from contextlib import contextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from components.timing import record_stage, enter_stage, exit_stage
+
+# Stages range from sub-millisecond NumPy work to multi-second Gemini calls
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_DURATION = Histogram(
+    "plan_stage_duration_seconds",
+    "Time spent in each backend stage (Mongo, HERE, Gemini, Amadeus, scoring, clustering, ...)",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+RETRIES = Counter("external_retries_total", "Retried calls to external services", ["service"])
+FALLBACKS = Counter("fallbacks_total", "Degraded results served instead of the real thing", ["kind"])
+EXTERNAL_ERRORS = Counter("external_api_errors_total", "Failed calls to external services", ["service"])
+SCORE_BATCH_SIZE = Histogram(
+    "score_batch_size",
+    "Requests scored together per micro-batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop heartbeat woke up",
+    buckets=STAGE_BUCKETS
+)
+LOOP_BLOCKS = Counter("event_loop_blocks_total", "Times the event loop was blocked past LOOP_BLOCK_THRESHOLD_MS", ["stage"])
+LOOP_BLOCKED_SECONDS = Counter("event_loop_blocked_seconds_total", "Time the event loop spent blocked past the heartbeat", ["stage"])
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Record the duration of the enclosed block (sync or async code) under `stage`, also for the current request."""
+    start = time.perf_counter()
+    task = enter_stage(stage)
+    try:
+        yield
+    finally:
+        exit_stage(task)
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record a stage duration measured by hand, e.g. summed over the awaits of a stream."""
+    STAGE_DURATION.labels(stage).observe(seconds)
+    record_stage(stage, seconds)
+
+
+class CacheCollector:
+    """Exports the counters every registered LRUCache already keeps, read at scrape time."""
+
+    def __init__(self):
+        self.caches = {}
+
+    def collect(self):
+        counters = {
+            name: CounterMetricFamily(f"cache_{name}", f"Cache {name} per cache", labels=["cache"])
+            for name in ("hits", "misses", "evictions", "expirations")
+        }
+        gauges = {
+            "entries": GaugeMetricFamily("cache_entries", "Entries per cache", labels=["cache"]),
+            "bytes": GaugeMetricFamily("cache_bytes", "Estimated bytes held per cache", labels=["cache"]),
+            "max_bytes": GaugeMetricFamily("cache_max_bytes", "Byte budget per cache", labels=["cache"])
+        }
+        for cache_name, cache in list(self.caches.items()):
+            stats = cache.stats()
+            for name, family in {**counters, **gauges}.items():
+                family.add_metric([cache_name], stats[name])
+        yield from counters.values()
+        yield from gauges.values()
+
+
+_cache_collector = CacheCollector()
+REGISTRY.register(_cache_collector)
+
+
+def register_cache(name: str, cache):
+    """Export an LRUCache's hit/miss/eviction/expiry counts and size as `cache_*{cache="name"}`."""
+    _cache_collector.caches[name] = cache
+
+
+def render_metrics():
+    """The current metrics in Prometheus text format, with their content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,210 @@
+# backend/components/pipeline.py
+import asyncio
+import logging
+from fastapi import HTTPException
+from components import repository
+from components.clustering import cluster_labels, unique_pois, poi_coords, group_clusters
+from components.executor import run_cpu
+from components.metrics import stage_timer, FALLBACKS
+from components.plan_cache import plan_cache_key, get_cached_plan, cache_plan
+from components.plan_generator import checkout_date_for, find_hotel, generate_plan_with_gemini, stream_plan_with_gemini
+from components.routing import day_orders, day_coords, apply_orders, start_point
+from components.score_batcher import score_batcher
+from components.vector import interests_to_vector
+from data.cities import city_coordinates
+from utils import fetch_poi_catalog
+
+# /generate-plan runs as explicit stages. The hotel branch (Amadeus hotel list +
+# offers) depends only on location and dates, so it runs concurrently with the POI
+# branch (catalog fetch, scoring, clustering). Once both are done each day's POIs
+# are ordered into a route starting at the hotel, then Gemini writes the plan.
+# Scoring, clustering and routing are CPU-bound, so they run on the plan executor
+# (components/executor.py) with NumPy arrays in and out, off the event loop.
+#
+# Error policy per stage:
+#   validate  - bad location or dates fail the request with 400
+#   catalog   - Mongo/HERE failures propagate and fail the request
+#   score     - no matching POIs fails the request with 404
+#   hotel     - never fails the request; degrades to a placeholder recommendation
+#   route     - never fails the request; keeps the clustered order
+#   gemini    - invalid or missing plan output fails the request with 500
+
+SIMILARITY_THRESHOLD = 0.3
+HOTEL_UNAVAILABLE = "Hotel recommendation unavailable"
+
+
+def validate_stage(request) -> dict:
+    city_info = city_coordinates.get(request.location)
+    if not city_info:
+        raise HTTPException(status_code=400, detail="Unsupported location")
+    try:
+        checkout_date_for(request.start_date, request.days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid start date: {str(e)}")
+    return city_info
+
+
+async def score_stage(request, catalog) -> list:
+    """Score the city's POIs against the user's interests, best matches first."""
+    user_vector = interests_to_vector(request.interests)
+    logging.info(f"User interests vector: {user_vector}")
+
+    # Filter POIs based on user interests
+    with stage_timer("score"):
+        indices, sims = await score_batcher.rank(catalog, user_vector, SIMILARITY_THRESHOLD)
+        filtered_pois = catalog.scorer.take(indices, sims)
+    logging.info(f"Filtered POIs ({len(filtered_pois)}/{len(catalog)}): {[(poi['name'], round(poi['similarity'], 3)) for poi in filtered_pois]}")
+
+    if not filtered_pois:
+        raise HTTPException(status_code=404, detail="No points of interest match your preferences")
+    return filtered_pois
+
+
+async def cluster_stage(request, filtered_pois: list) -> list:
+    """Cluster the matching POIs into one group per day."""
+    with stage_timer("cluster_pois"):
+        pois = unique_pois(filtered_pois)
+        labels = await run_cpu(cluster_labels, poi_coords(pois), min(request.days, len(pois)), size=len(pois))
+        daily_pois = group_clusters(pois, labels, request.days)
+    logging.info(f"Daily POIs (names only for logging): {[[poi['name'] for poi in cluster] for cluster in daily_pois]}")
+    return daily_pois
+
+
+async def hotel_stage(request) -> dict:
+    """The hotel recommendation and, when known, the hotel's location."""
+    try:
+        return await find_hotel(request.location, request.start_date, request.days)
+    except Exception as e:
+        logging.error(f"Hotel stage failed for {request.location}, continuing without a hotel: {str(e)}")
+        FALLBACKS.labels("hotel_unavailable").inc()
+        return {"recommendation": HOTEL_UNAVAILABLE, "location": None}
+
+
+async def route_stage(daily_pois: list, hotel_location=None) -> list:
+    """Order each day's POIs into a short route, starting from the hotel when its location is known."""
+    try:
+        with stage_timer("route"):
+            orders = await run_cpu(
+                day_orders, day_coords(daily_pois), start_point(hotel_location),
+                size=sum(len(day) for day in daily_pois)
+            )
+        routed = apply_orders(daily_pois, orders)
+        logging.info(f"Routed {sum(len(day) for day in routed)} POIs over {len(routed)} days"
+                     f"{' from the hotel' if hotel_location else ''}")
+        return routed
+    except Exception as e:
+        logging.error(f"Route stage failed, keeping the clustered order: {str(e)}")
+        FALLBACKS.labels("route_order").inc()
+        return daily_pois
+
+
+async def gemini_stage(request, daily_pois: list, hotel_recommendation: str) -> dict:
+    try:
+        return await generate_plan_with_gemini(
+            request.location,
+            request.start_date,
+            request.days,
+            request.interests,
+            request.budget,
+            daily_pois,
+            hotel_recommendation=hotel_recommendation
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate plan: {str(e)}")
+
+
+async def store_stage(request, plan_data: dict) -> str:
+    """Persist a generated plan and return its plan_id."""
+    plan_doc = {
+        "location": request.location,
+        "start_date": request.start_date,
+        "days": request.days,
+        "interests": request.interests,
+        "budget": request.budget,
+        "plan": plan_data["plan"],
+        "hotel": plan_data["Hotel"]
+    }
+    with stage_timer("mongo_insert"):
+        plan_id = await repository.insert_plan(plan_doc)
+    logging.info(f"Stored plan with plan_id: {plan_id}")
+    return plan_id
+
+
+async def plan_pipeline_events(request, use_cache: bool = True, stream_days: bool = False):
+    """
+    Run every stage for a PlanRequest, yielding (event, data) pairs as stages finish.
+
+    Events: "pois" (selected POIs), "clusters" (POI names per day), "hotel",
+    "routes" (POI names per day in visiting order), "day"
+    (one per itinerary day; only with stream_days or on a plan cache hit) and
+    finally "plan" with the complete plan data.
+    """
+    city_info = validate_stage(request)
+
+    hotel_task = asyncio.create_task(hotel_stage(request))
+    try:
+        catalog = await fetch_poi_catalog(city_info["iata"])
+        logging.info(f"Fetched {len(catalog)} POIs for {request.location}")
+
+        # Serve effectively identical requests from the plan cache
+        cache_key = plan_cache_key(request, catalog.version)
+        plan_data = get_cached_plan(cache_key) if use_cache else None
+        if plan_data is not None:
+            logging.info(f"Plan cache hit for {request.location} ({request.days} days)")
+            hotel_task.cancel()
+            yield "hotel", {"hotel": plan_data["Hotel"]}
+            for day_entry in plan_data["plan"]:
+                yield "day", day_entry
+            yield "plan", plan_data
+            return
+
+        filtered_pois = await score_stage(request, catalog)
+        yield "pois", {"count": len(filtered_pois), "pois": [{"name": poi["name"], "similarity": round(poi["similarity"], 3)} for poi in filtered_pois]}
+
+        daily_pois = await cluster_stage(request, filtered_pois)
+        yield "clusters", {"days": [[poi["name"] for poi in cluster] for cluster in daily_pois]}
+
+        hotel = await hotel_task
+        hotel_recommendation = hotel["recommendation"]
+        yield "hotel", {"hotel": hotel_recommendation}
+
+        daily_pois = await route_stage(daily_pois, hotel["location"])
+        yield "routes", {"days": [[poi["name"] for poi in day] for day in daily_pois]}
+    finally:
+        # Covers failures and consumers that stop early (e.g. a client disconnecting)
+        if not hotel_task.done():
+            hotel_task.cancel()
+
+    if stream_days:
+        try:
+            async for event, data in stream_plan_with_gemini(
+                request.location,
+                request.start_date,
+                request.days,
+                request.interests,
+                request.budget,
+                daily_pois,
+                hotel_recommendation
+            ):
+                if event == "plan":
+                    plan_data = data
+                else:
+                    yield event, data
+        except ValueError as e:
+            raise HTTPException(status_code=500, detail=f"Failed to generate plan: {str(e)}")
+    else:
+        plan_data = await gemini_stage(request, daily_pois, hotel_recommendation)
+
+    cache_plan(cache_key, plan_data)
+    yield "plan", plan_data
+
+
+async def run_plan_pipeline(request, use_cache: bool = True, on_event=None) -> dict:
+    """Run the pipeline to completion and return the plan data; `on_event(event, data)` sees each stage event."""
+    plan_data = None
+    async for event, data in plan_pipeline_events(request, use_cache=use_cache):
+        if event == "plan":
+            plan_data = data
+        elif on_event is not None:
+            await on_event(event, data)
+    return plan_data
@@ -0,0 +1,55 @@
+# backend/components/plan_cache.py
+import copy
+import json
+import math
+import os
+from components.cache import LRUCache
+from components.metrics import register_cache
+
+# Interest weights are rounded to this step, so 0.72 and 0.68 share a cache entry
+INTEREST_STEP = float(os.getenv("PLAN_CACHE_INTEREST_STEP", 0.1))
+# Budgets fall into geometric bands, each this many times wider than the previous one
+BUDGET_BAND_RATIO = float(os.getenv("PLAN_CACHE_BUDGET_BAND_RATIO", 1.25))
+
+plan_cache = LRUCache(
+    max_bytes=int(os.getenv("PLAN_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+    ttl=float(os.getenv("PLAN_CACHE_TTL_SECONDS", 6 * 3600))
+)
+register_cache("plan", plan_cache)
+
+
+def quantize_interests(interests: dict) -> list:
+    quantized = []
+    for interest, score in interests.items():
+        level = round(score / INTEREST_STEP)
+        if level > 0:
+            quantized.append((interest, level))
+    return sorted(quantized)
+
+
+def budget_band(budget: float) -> int:
+    if budget <= 1:
+        return 0
+    return int(math.log(budget) / math.log(BUDGET_BAND_RATIO))
+
+
+def plan_cache_key(request, catalog_version: str) -> str:
+    """Canonical key for a PlanRequest against a specific version of the city's POI catalog."""
+    return json.dumps([
+        request.location,
+        request.start_date,
+        request.days,
+        quantize_interests(request.interests),
+        budget_band(request.budget),
+        catalog_version
+    ])
+
+
+def get_cached_plan(key: str):
+    plan_data = plan_cache.get(key)
+    # Callers get their own copy so later edits cannot leak into the cache
+    return copy.deepcopy(plan_data) if plan_data is not None else None
+
+
+def cache_plan(key: str, plan_data: dict):
+    plan_cache.set(key, copy.deepcopy(plan_data))
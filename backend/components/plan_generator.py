@@ -1,103 +1,115 @@
 # components/plan_generator.py
-import google.generativeai as genai
 import logging
 import json
+import time
 import re
-import os
 from datetime import datetime, timedelta
-from amadeus import Client, ResponseError
-from dotenv import load_dotenv
-from datetime import datetime, timedelta
-# Load environment variables
-load_dotenv()
-
-# Initialize Amadeus client
-amadeus = Client(
-    client_id=os.getenv("AMADEUS_API_KEY"),
-    client_secret=os.getenv("AMADEUS_API_SECRET"),
-    hostname="test"
-)
-
-async def generate_plan_with_gemini(location, start_date, days, interests, budget, daily_pois):
+from amadeus import ResponseError
+from components.hotels import get_city_hotels, get_hotel_offers
+from components.clients import get_genai
+from components.metrics import stage_timer, observe_stage, EXTERNAL_ERRORS
+from data.cities import city_coordinates
+from components.stream_parser import IncrementalPlanParser
+from components.models import DailyItinerary
+from pydantic import ValidationError
+
+
+def checkout_date_for(start_date: str, days: int) -> str:
+    """Validate the start date and return the checkout date for a stay of `days` nights."""
+    start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
+
+    # Validate start date is within 330 days from today
+    today = datetime.now()
+    max_start_date = today + timedelta(days=330)
+    if start_date_obj > max_start_date:
+        raise ValueError(f"Start date must be within 330 days from today ({max_start_date.strftime('%Y-%m-%d')})")
+
+    checkout_date_obj = start_date_obj + timedelta(days=days)
+    return checkout_date_obj.strftime("%Y-%m-%d")
+
+async def find_hotel_recommendation(location, start_date, days) -> str:
+    """Pick a hotel for the stay from the Amadeus Hotel List and Hotel Search APIs."""
+    hotel = await find_hotel(location, start_date, days)
+    return hotel["recommendation"]
+
+async def find_hotel(location, start_date, days) -> dict:
+    """
+    Pick a hotel for the stay; returns {"recommendation": str, "location": {"lat", "lon"} or None}.
+
+    The location is the chosen hotel's coordinates from the Hotel List API, when available.
+    """
+    hotel_location = None
+    checkout_date = checkout_date_for(start_date, days)
+
+    # Get the city code (IATA code) for the location
+    city_info = city_coordinates.get(location)
+    if not city_info:
+        raise ValueError("Unsupported location")
+
+    city_code = city_info["iata"]
+    if not city_code:
+        raise ValueError("City code not found for this location")
+
+    # Log the city code for debugging
+    logging.info(f"Using cityCode: {city_code}")
+
+    # Step 1: Use Hotel List API to get hotel IDs for the city
     try:
-        # Calculate checkout date
-        start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
-        checkout_date_obj = start_date_obj + timedelta(days=days)
-        checkout_date = checkout_date_obj.strftime("%Y-%m-%d")
-
-        # Validate start date is within 330 days from today
-        today = datetime.now()
-        max_start_date = today + timedelta(days=330)
-        if start_date_obj > max_start_date:
-            raise ValueError(f"Start date must be within 330 days from today ({max_start_date.strftime('%Y-%m-%d')})")
-
-        # Get the city code (IATA code) for the location
-        from data.cities import city_coordinates  # Import city_coordinates
-        city_info = city_coordinates.get(location)
-        if not city_info:
-            raise ValueError("Unsupported location")
-
-        city_code = city_info["iata"]
-        if not city_code:
-            raise ValueError("City code not found for this location")
-
-        # Log the city code for debugging
-        logging.info(f"Using cityCode: {city_code}")
-
-        # Step 1: Use Hotel List API to get hotel IDs for the city
-        try:
-            hotel_list_response = amadeus.reference_data.locations.hotels.by_city.get(
-                cityCode=city_code,
-                ratings=["3", "4", "5"]  # Filter by ratings (list of strings)
-            )
-        except ResponseError as e:
-            logging.error(f"Amadeus Hotel List API error: {str(e)}")
-            logging.error(f"Error details: {e.response.body if e.response else 'No response body'}")
-            hotel_recommendation = "Hotel recommendation unavailable"
+        hotels_list = await get_city_hotels(
+            city_code,
+            ratings=["3", "4", "5"]  # Filter by ratings (list of strings)
+        )
+    except ResponseError as e:
+        logging.error(f"Amadeus Hotel List API error: {str(e)}")
+        logging.error(f"Error details: {e.response.body if e.response else 'No response body'}")
+        hotel_recommendation = "Hotel recommendation unavailable"
+    else:
+        if not hotels_list:
+            hotel_recommendation = "No hotels found in Hotel List API"
         else:
-            hotels_list = hotel_list_response.data
-            if not hotels_list:
-                hotel_recommendation = "No hotels found in Hotel List API"
+            # Extract hotel IDs (limit to first 5 to avoid overwhelming the next API call)
+            hotel_ids = [hotel["hotelId"] for hotel in hotels_list[:5]]
+            # Store ratings from Hotel List API
+            hotel_ratings_map = {hotel["hotelId"]: hotel.get("rating", 0) for hotel in hotels_list}
+            logging.info(f"Retrieved hotel IDs: {hotel_ids}")
+
+            # Step 2: Use Hotel Search API to get offers for the retrieved hotel IDs
+            try:
+                hotels = await get_hotel_offers(
+                    hotel_ids,
+                    start_date,
+                    checkout_date,
+                    adults=2,
+                    currency="USD"
+                )
+            except ResponseError as e:
+                logging.error(f"Amadeus Hotel Search API error: {str(e)}")
+                logging.error(f"Error details: {e.response.body if e.response else 'No response body'}")
+                hotel_recommendation = "Hotel recommendation unavailable"
             else:
-                # Extract hotel IDs (limit to first 5 to avoid overwhelming the next API call)
-                hotel_ids = [hotel["hotelId"] for hotel in hotels_list[:5]]
-                # Store ratings from Hotel List API
-                hotel_ratings_map = {hotel["hotelId"]: hotel.get("rating", 0) for hotel in hotels_list}
-                logging.info(f"Retrieved hotel IDs: {hotel_ids}")
-
-                # Step 2: Use Hotel Search API to get offers for the retrieved hotel IDs
-                try:
-                    response = amadeus.shopping.hotel_offers_search.get(
-                        hotelIds=",".join(hotel_ids),  # Comma-separated string of hotel IDs
-                        checkInDate=start_date,
-                        checkOutDate=checkout_date,
-                        adults=2,
-                        currency="USD"
-                    )
-                except ResponseError as e:
-                    logging.error(f"Amadeus Hotel Search API error: {str(e)}")
-                    logging.error(f"Error details: {e.response.body if e.response else 'No response body'}")
-                    hotel_recommendation = "Hotel recommendation unavailable"
+                if hotels:
+                    top_hotel = hotels[0]
+                    hotel_info = top_hotel.get("hotel", {})
+                    hotel_id = hotel_info.get("hotelId")
+                    offer = top_hotel.get("offers", [{}])[0]
+                    price = offer.get("price", {}).get("total", "N/A")
+                    # Use rating from Hotel List API
+                    rating = hotel_ratings_map.get(hotel_id, 0)
+                    hotel_recommendation = f"{hotel_info.get('name', 'Unknown Hotel')} (Rating: {rating}, Price: ${price})"
+                    geo_code = next((hotel.get("geoCode") for hotel in hotels_list if hotel["hotelId"] == hotel_id), None) or {}
+                    if "latitude" in geo_code and "longitude" in geo_code:
+                        hotel_location = {"lat": geo_code["latitude"], "lon": geo_code["longitude"]}
                 else:
-                    hotels = response.data
-                    if hotels:
-                        top_hotel = hotels[0]
-                        hotel_info = top_hotel.get("hotel", {})
-                        hotel_id = hotel_info.get("hotelId")
-                        offer = top_hotel.get("offers", [{}])[0]
-                        price = offer.get("price", {}).get("total", "N/A")
-                        # Use rating from Hotel List API
-                        rating = hotel_ratings_map.get(hotel_id, 0)
-                        hotel_recommendation = f"{hotel_info.get('name', 'Unknown Hotel')} (Rating: {rating}, Price: ${price})"
-                    else:
-                        hotel_recommendation = "No hotels found"
+                    hotel_recommendation = "No hotels found"
 
-        # Prepare the prompt for Gemini
-        prompt = f"""
+    return {"recommendation": hotel_recommendation, "location": hotel_location}
+
+def build_plan_prompt(location, start_date, days, interests, budget, daily_pois, hotel_recommendation) -> str:
+    return f"""
         Generate a {days}-day travel itinerary for {location} starting on {start_date}.
         User interests: {interests}
         Budget: {budget}
-        Points of Interest per day: {daily_pois}
+        Points of Interest per day, each day in suggested visiting order: {daily_pois}
         Include a hotel recommendation. I have already found a hotel: {hotel_recommendation}.
         Format the response as a JSON object with a "plan" array (one entry per day) and a "Hotel" field.
         Each day in the "plan" array should have a "day" field (as an integer, e.g., 1, 2, 3), "morning", "afternoon", "late_afternoon", "evening", "dinner", "night", and "notes" fields.
@@ -110,56 +122,126 @@ async def generate_plan_with_gemini(location, start_date, days, interests, budge
         }}
         """
 
-        # Call Gemini API
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
-        plan_data = response.text  # Assume this is a JSON string
+def normalize_day(day_entry: dict, i: int) -> dict:
+    """Fix the "day" field of the i-th day (1-based) to be the integer i."""
+    if "day" not in day_entry:
+        day_entry["day"] = i
+    else:
+        # Convert day to int and ensure it matches the expected day number
+        try:
+            day_entry["day"] = int(day_entry["day"])
+        except (ValueError, TypeError):
+            day_entry["day"] = i  # Fallback to the correct day number
+        if day_entry["day"] != i:
+            logging.warning(f"Day {i} has incorrect day value {day_entry['day']}, correcting to {i}")
+            day_entry["day"] = i
+    return day_entry
+
+def parse_plan_response(plan_text: str, days: int) -> dict:
+    """Extract, parse and validate the plan JSON from Gemini's full response text."""
+    # Log the raw response for debugging
+    logging.info(f"Raw Gemini API response: {plan_text}")
+
+    # Handle empty response
+    if not plan_text or plan_text.strip() == "":
+        raise ValueError("Gemini API returned an empty response")
+
+    # Extract JSON from the response (in case it's embedded in extra text)
+    json_match = re.search(r'\{.*\}', plan_text, re.DOTALL)
+    if not json_match:
+        raise ValueError("No valid JSON object found in Gemini API response")
+
+    json_str = json_match.group(0)
+    logging.info(f"Extracted JSON string: {json_str}")
+
+    # Parse the JSON response
+    try:
+        plan_data = json.loads(json_str)
+    except json.JSONDecodeError as e:
+        logging.error(f"Failed to parse JSON: {str(e)}")
+        raise ValueError(f"Gemini API response is not valid JSON: {json_str}")
+
+    # Validate the response
+    if "plan" not in plan_data or "Hotel" not in plan_data:
+        raise ValueError("Invalid response format from Gemini API: missing 'plan' or 'Hotel' field")
 
-        # Log the raw response for debugging
-        logging.info(f"Raw Gemini API response: {plan_data}")
+    # Ensure the plan has the correct number of days
+    if len(plan_data["plan"]) != days:
+        raise ValueError(f"Expected {days} days in the plan, got {len(plan_data['plan'])}")
 
-        # Handle empty response
-        if not plan_data or plan_data.strip() == "":
-            raise ValueError("Gemini API returned an empty response")
+    # Fix the "day" field to ensure it's an integer
+    for i, day_entry in enumerate(plan_data["plan"], start=1):
+        normalize_day(day_entry, i)
 
-        # Extract JSON from the response (in case it's embedded in extra text)
-        json_match = re.search(r'\{.*\}', plan_data, re.DOTALL)
-        if not json_match:
-            raise ValueError("No valid JSON object found in Gemini API response")
+    return plan_data
 
-        json_str = json_match.group(0)
-        logging.info(f"Extracted JSON string: {json_str}")
+async def generate_plan_with_gemini(location, start_date, days, interests, budget, daily_pois, hotel_recommendation=None):
+    try:
+        if hotel_recommendation is None:
+            hotel_recommendation = await find_hotel_recommendation(location, start_date, days)
+
+        # Prepare the prompt for Gemini
+        prompt = build_plan_prompt(location, start_date, days, interests, budget, daily_pois, hotel_recommendation)
 
-        # Parse the JSON response
+        # Call Gemini API
+        model = get_genai().GenerativeModel('gemini-1.5-flash')
         try:
-            plan_data = json.loads(json_str)
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse JSON: {str(e)}")
-            raise ValueError(f"Gemini API response is not valid JSON: {json_str}")
-
-        # Validate the response
-        if "plan" not in plan_data or "Hotel" not in plan_data:
-            raise ValueError("Invalid response format from Gemini API: missing 'plan' or 'Hotel' field")
-
-        # Ensure the plan has the correct number of days
-        if len(plan_data["plan"]) != days:
-            raise ValueError(f"Expected {days} days in the plan, got {len(plan_data['plan'])}")
-
-        # Fix the "day" field to ensure it's an integer
-        for i, day_entry in enumerate(plan_data["plan"], start=1):
-            if "day" not in day_entry:
-                day_entry["day"] = i
-            else:
-                # Convert day to int and ensure it matches the expected day number
-                try:
-                    day_entry["day"] = int(day_entry["day"])
-                except (ValueError, TypeError):
-                    day_entry["day"] = i  # Fallback to the correct day number
-                if day_entry["day"] != i:
-                    logging.warning(f"Day {i} has incorrect day value {day_entry['day']}, correcting to {i}")
-                    day_entry["day"] = i
-
-        return plan_data
+            with stage_timer("gemini"):
+                response = await model.generate_content_async(prompt)
+        except Exception:
+            EXTERNAL_ERRORS.labels("gemini").inc()
+            raise
+        return parse_plan_response(response.text, days)
     except Exception as e:
         logging.error(f"Error generating plan with Gemini: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+async def stream_plan_with_gemini(location, start_date, days, interests, budget, daily_pois, hotel_recommendation):
+    """
+    Stream the plan from Gemini.
+
+    Yields ("day", day) for each day object as soon as Gemini's output contains all
+    of it, then ("plan", plan_data) with the full plan parsed and validated exactly
+    like generate_plan_with_gemini does.
+    """
+    try:
+        prompt = build_plan_prompt(location, start_date, days, interests, budget, daily_pois, hotel_recommendation)
+        model = get_genai().GenerativeModel('gemini-1.5-flash')
+        parser = IncrementalPlanParser()
+        chunks = []
+        # Only the waits on Gemini count as gemini time, not how long the consumer takes per event
+        upstream = 0.0
+        try:
+            start = time.perf_counter()
+            response = await model.generate_content_async(prompt, stream=True)
+            stream = response.__aiter__()
+            while True:
+                try:
+                    chunk = await stream.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    upstream += time.perf_counter() - start
+                chunks.append(chunk.text)
+                for index, day_entry in parser.feed(chunk.text):
+                    day_number = index + 1
+                    if day_number > days:
+                        continue
+                    day_entry = normalize_day(day_entry, day_number)
+                    try:
+                        DailyItinerary.model_validate(day_entry)
+                    except ValidationError as e:
+                        logging.warning(f"Streamed day {day_number} is not a valid itinerary day, leaving it for the final plan: {str(e)}")
+                        continue
+                    yield "day", day_entry
+                start = time.perf_counter()
+        except Exception:
+            EXTERNAL_ERRORS.labels("gemini").inc()
+            raise
+        finally:
+            observe_stage("gemini", upstream)
+
+        yield "plan", parse_plan_response("".join(chunks), days)
+    except Exception as e:
+        logging.error(f"Error streaming plan with Gemini: {str(e)}")
+        raise
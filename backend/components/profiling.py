@@ -0,0 +1,94 @@
+# backend/components/profiling.py
+import cProfile
+import hmac
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from components.rate_limiter import AsyncTokenBucket
+from components.executor import inline_execution
+
+# Profiling is off unless PROFILE_TOKEN is set; a request opts in by sending the token
+# in the X-Profile-Token header (never the query string, which ends up in access logs)
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", Path(__file__).parent.parent / "profiles"))
+PROFILES_PER_MINUTE = float(os.getenv("PROFILES_PER_MINUTE", 6))
+
+profile_limiter = AsyncTokenBucket(rate=PROFILES_PER_MINUTE / 60, capacity=max(PROFILES_PER_MINUTE, 1))
+_profiling = False  # cProfile can only profile one request on the event loop thread at a time
+
+
+def has_profile_token(request) -> bool:
+    """Whether the request carries PROFILE_TOKEN in its X-Profile-Token header; also guards the debug endpoints."""
+    token = request.headers.get("x-profile-token")
+    return bool(PROFILE_TOKEN and token and hmac.compare_digest(token, PROFILE_TOKEN))
+
+
+def _slug(value) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", str(value)).strip("-") or "none"
+
+
+async def _tags(request) -> dict:
+    """Endpoint, city and days of the request, from its query string or JSON body."""
+    tags = {"endpoint": request.url.path, "city": request.query_params.get("location"), "days": request.query_params.get("days")}
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = json.loads(await request.body() or b"{}")
+        except ValueError:
+            body = {}
+        if isinstance(body, dict):
+            tags["city"] = body.get("location", tags["city"])
+            tags["days"] = body.get("days", tags["days"])
+    return tags
+
+
+async def profiling_middleware(request, call_next):
+    """
+    Profile a single request with cProfile when it carries the profile token.
+
+    The profile is written to PROFILE_DIR as a .prof file (pstats format, which
+    snakeviz and flameprof turn into flame graphs) named after the endpoint, city
+    and days, and its name is returned in the X-Profile header. At most
+    PROFILES_PER_MINUTE requests are profiled, one at a time. cProfile sees
+    everything on the event loop thread, so other requests running concurrently
+    show up too; streaming responses are profiled up to the start of the stream.
+
+    cProfile cannot see work in the plan executor's worker processes or threads, so
+    a profiled request runs its scoring, clustering and routing inline instead.
+    """
+    global _profiling
+    if not has_profile_token(request) or _profiling or not profile_limiter.try_acquire():
+        return await call_next(request)
+
+    tags = await _tags(request)
+    profiler = cProfile.Profile()
+    _profiling = True
+    try:
+        profiler.enable()
+        try:
+            with inline_execution():
+                response = await call_next(request)
+        finally:
+            profiler.disable()
+    finally:
+        _profiling = False
+
+    name = "_".join([
+        time.strftime("%Y%m%d-%H%M%S"),
+        _slug(tags["endpoint"]),
+        _slug(tags["city"]),
+        f"{_slug(tags['days'])}d",
+        uuid.uuid4().hex[:6]
+    ]) + ".prof"
+    try:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(PROFILE_DIR / name)
+    except OSError as e:
+        logging.error(f"Failed to write profile {name}: {str(e)}")
+        return response
+    logging.info(f"Wrote profile {PROFILE_DIR / name}")
+    response.headers["X-Profile"] = name
+    return response
@@ -0,0 +1,220 @@
+# backend/components/repository.py
+import os
+import logging
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta, timezone
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+
+DATABASE_NAME = "trip_planner"
+
+_client = None
+
+
+def get_client() -> AsyncIOMotorClient:
+    """Return the shared MongoDB client, creating it (and its connection pool) on first use."""
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            os.getenv("MONGO_URI"),
+            maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", 100)),
+            minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+            maxIdleTimeMS=int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000)),
+            waitQueueTimeoutMS=int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000)),
+            serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000))
+        )
+    return _client
+
+
+def get_db():
+    return get_client()[DATABASE_NAME]
+
+
+def pois_collection():
+    return get_db()["pois"]
+
+
+def poi_versions_collection():
+    return get_db()["poi_versions"]
+
+
+def hotel_lists_collection():
+    return get_db()["hotel_lists"]
+
+
+def ingest_leases_collection():
+    return get_db()["ingest_leases"]
+
+
+def plans_collection():
+    # Plans are read back right after being written, so use majority read/write concern
+    return get_db().get_collection(
+        "plans",
+        write_concern=WriteConcern(w="majority"),
+        read_concern=ReadConcern("majority")
+    )
+
+
+async def ping():
+    await get_client().admin.command("ping")
+    logging.info("MongoDB Atlas connection successful")
+
+
+def close():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+        logging.info("MongoDB Atlas connection closed")
+
+
+# POIs
+
+# Every write to a city's POIs bumps its counter in poi_versions, so API workers can
+# tell with one _id lookup that their cached catalog is stale.
+
+async def find_city_pois(city_iata: str) -> list:
+    return await pois_collection().find({"city": city_iata}).to_list(length=None)
+
+
+async def find_poi_version(city_iata: str) -> int:
+    doc = await poi_versions_collection().find_one({"_id": city_iata})
+    return doc["version"] if doc else 0
+
+
+async def bump_poi_versions(cities):
+    cities = set(cities)
+    if cities:
+        await poi_versions_collection().bulk_write(
+            [UpdateOne({"_id": city}, {"$inc": {"version": 1}}, upsert=True) for city in cities],
+            ordered=False
+        )
+
+
+async def insert_pois(pois: list):
+    # Unordered, so one duplicate (city, name) does not stop the rest of the batch
+    try:
+        return await pois_collection().insert_many(pois, ordered=False)
+    finally:
+        await bump_poi_versions(poi["city"] for poi in pois)
+
+
+async def upsert_poi(city_iata: str, name: str, fields: dict):
+    result = await pois_collection().update_one(
+        {"city": city_iata, "name": name},
+        {"$set": fields},
+        upsert=True
+    )
+    await bump_poi_versions([city_iata])
+    return result
+
+
+async def delete_city_pois(city_iata: str, names: list):
+    result = await pois_collection().delete_many({"city": city_iata, "name": {"$in": list(names)}})
+    await bump_poi_versions([city_iata])
+    return result
+
+
+async def replace_all_pois(pois: list):
+    old_cities = await pois_collection().distinct("city")
+    # delete_many rather than drop, which would also drop the unique (city, name) index
+    await pois_collection().delete_many({})
+    if pois:
+        await pois_collection().insert_many(pois)
+    await bump_poi_versions(old_cities + [poi["city"] for poi in pois])
+
+
+# City ingestion leases
+
+async def acquire_ingest_lease(city_iata: str, owner: str, ttl_seconds: float) -> bool:
+    """Take (or renew) the lease to ingest a city's POIs; False while another owner holds an unexpired lease."""
+    now = datetime.now(timezone.utc)
+    try:
+        await ingest_leases_collection().update_one(
+            {"_id": city_iata, "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lease exists and belongs to someone else, so the upsert collided with it
+        return False
+    return True
+
+
+async def release_ingest_lease(city_iata: str, owner: str):
+    return await ingest_leases_collection().delete_one({"_id": city_iata, "owner": owner})
+
+
+# Plans
+
+async def insert_plan(plan_doc: dict) -> str:
+    result = await plans_collection().insert_one(plan_doc)
+    return str(result.inserted_id)
+
+
+async def find_plan(plan_id: str):
+    return await plans_collection().find_one({"_id": ObjectId(plan_id)})
+
+
+async def update_plan(plan_id: str, fields: dict):
+    return await plans_collection().update_one(
+        {"_id": ObjectId(plan_id)},
+        {"$set": fields}
+    )
+
+
+# Hotel lists
+
+async def find_hotel_list(key: str):
+    return await hotel_lists_collection().find_one({"_id": key})
+
+
+async def save_hotel_list(key: str, hotels: list, fetched_at: float):
+    return await hotel_lists_collection().replace_one(
+        {"_id": key},
+        {"hotels": hotels, "fetched_at": fetched_at},
+        upsert=True
+    )
+
+
+# Plan jobs
+
+def plan_jobs_collection():
+    return get_db()["plan_jobs"]
+
+
+async def insert_job(job_doc: dict) -> str:
+    result = await plan_jobs_collection().insert_one(job_doc)
+    return str(result.inserted_id)
+
+
+async def find_job(job_id: str):
+    return await plan_jobs_collection().find_one({"_id": ObjectId(job_id)})
+
+
+async def update_job(job_id: str, fields: dict):
+    return await plan_jobs_collection().update_one(
+        {"_id": ObjectId(job_id)},
+        {"$set": fields}
+    )
+
+
+async def claim_job(job_id: str, fields: dict):
+    """Atomically move a queued job to running; returns None if another worker already took it."""
+    return await plan_jobs_collection().find_one_and_update(
+        {"_id": ObjectId(job_id), "status": "queued"},
+        {"$set": {"status": "running", **fields}}
+    )
+
+
+async def find_resumable_jobs(stale_before) -> list:
+    """Queued jobs, plus running jobs whose worker stopped updating them before `stale_before`."""
+    return await plan_jobs_collection().find({
+        "$or": [
+            {"status": "queued"},
+            {"status": "running", "updated_at": {"$lt": stale_before}}
+        ]
+    }).sort("created_at", 1).to_list(length=None)
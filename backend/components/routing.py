@@ -0,0 +1,128 @@
+# backend/components/routing.py
+import numpy as np
+from components.distance import haversine_matrix
+
+MAX_TWO_OPT_PASSES = 100
+
+
+def _nearest_neighbour(dist: np.ndarray, starts) -> np.ndarray:
+    """
+    Nearest-neighbour paths from each start node at once; returns a (len(starts), n) array.
+
+    All starts advance in lockstep, so the work is n vectorized steps rather than a
+    Python loop per start.
+    """
+    n = len(dist)
+    starts = np.asarray(starts)
+    rows = np.arange(len(starts))
+    paths = np.empty((len(starts), n), dtype=np.intp)
+    paths[:, 0] = starts
+    visited = np.zeros((len(starts), n), dtype=bool)
+    visited[rows, starts] = True
+    current = starts
+    for step in range(1, n):
+        candidates = np.where(visited, np.inf, dist[current])
+        current = np.argmin(candidates, axis=1)
+        paths[:, step] = current
+        visited[rows, current] = True
+    return paths
+
+
+def _path_lengths(dist: np.ndarray, paths: np.ndarray) -> np.ndarray:
+    return dist[paths[:, :-1], paths[:, 1:]].sum(axis=1)
+
+
+def _two_opt(dist: np.ndarray, path: np.ndarray, fixed_start: bool) -> np.ndarray:
+    """
+    Improve an open path with best-improvement 2-opt; every candidate move is scored in one array operation.
+
+    The path is closed with a dummy node at zero distance from everything, so
+    reversing a segment that touches an open end is an ordinary 2-opt move. With
+    `fixed_start` the first node stays first.
+    """
+    n = len(dist)
+    padded = np.zeros((n + 1, n + 1))
+    padded[:n, :n] = dist
+    dummy = n
+    route = np.concatenate(([path[0]] if fixed_start else [dummy], path[1:] if fixed_start else path, [dummy]))
+
+    for _ in range(MAX_TWO_OPT_PASSES):
+        prev, nxt = route[:-1], route[1:]
+        edges = padded[prev, nxt]
+        # Reversing route[i..j] replaces edges (i-1, i) and (j, j+1) with (i-1, j) and (i, j+1)
+        delta = padded[prev[:, None], prev[None, :]] + padded[nxt[:, None], nxt[None, :]] - edges[:, None] - edges[None, :]
+        delta = np.triu(delta, k=2)
+        t1, t2 = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[t1, t2] >= -1e-9:
+            break
+        route[t1 + 1:t2 + 1] = route[t1 + 1:t2 + 1][::-1]
+
+    return route[1:-1] if not fixed_start else route[:-1]
+
+
+def order_route(dist: np.ndarray, start=None) -> list:
+    """
+    Order the nodes of a distance matrix into a short open path (nearest neighbour + 2-opt).
+
+    Args:
+        dist: (n, n) symmetric distance matrix.
+        start: Index of the node the path must start from, or None to let the path
+            start anywhere (nearest neighbour is then tried from every node).
+
+    Returns:
+        list: Node indices in visiting order.
+    """
+    n = len(dist)
+    if n <= 2:
+        if start is None or n < 2:
+            return list(range(n))
+        return [start, 1 - start]
+
+    dist = np.asarray(dist, dtype=np.float64)
+    if start is None:
+        paths = _nearest_neighbour(dist, np.arange(n))
+        path = paths[int(np.argmin(_path_lengths(dist, paths)))]
+    else:
+        path = _nearest_neighbour(dist, [start])[0]
+    return _two_opt(dist, path, fixed_start=start is not None).tolist()
+
+
+def day_order(lats, lons, start=None) -> list:
+    """
+    Visiting order of one day's points, as indices into `lats`/`lons`.
+
+    Args:
+        lats, lons: The points' coordinates in degrees.
+        start: Optional (lat, lon) the route starts from (e.g. the hotel).
+    """
+    n = len(lats)
+    if n < 2:
+        return list(range(n))
+    if start is None:
+        return order_route(haversine_matrix(lats, lons))
+
+    dist = haversine_matrix(np.concatenate(([start[0]], lats)), np.concatenate(([start[1]], lons)))
+    return [i - 1 for i in order_route(dist, start=0)[1:]]
+
+
+def day_orders(days: list, start=None) -> list:
+    """day_order for several days at once; `days` is a list of (lats, lons) arrays."""
+    return [day_order(lats, lons, start) for lats, lons in days]
+
+
+def day_coords(daily_pois: list) -> list:
+    """The (lats, lons) arrays of each day's POIs, as day_orders takes them."""
+    return [
+        (np.array([poi["lat"] for poi in day], dtype=np.float64), np.array([poi["lon"] for poi in day], dtype=np.float64))
+        for day in daily_pois
+    ]
+
+
+def start_point(start_location):
+    """A {'lat', 'lon'} location as the (lat, lon) start day_order takes."""
+    return None if start_location is None else (start_location["lat"], start_location["lon"])
+
+
+def apply_orders(daily_pois: list, orders: list) -> list:
+    """Reorder each day's POIs by the matching day_orders result."""
+    return [[day[i] for i in order] for day, order in zip(daily_pois, orders)]
@@ -0,0 +1,85 @@
+# backend/components/score_batcher.py
+import asyncio
+import logging
+import os
+import numpy as np
+from components.executor import run_cpu
+from components.metrics import SCORE_BATCH_SIZE
+from components.scoring import rank_pois, rank_pois_many
+
+# Off by default: with a window of 0 every request is scored on its own
+SCORE_BATCH_WINDOW_MS = float(os.getenv("SCORE_BATCH_WINDOW_MS", 0))
+SCORE_BATCH_MAX_SIZE = int(os.getenv("SCORE_BATCH_MAX_SIZE", 32))
+# Scoring costs about 0.1 us per POI and request, so only offload it to the plan
+# executor once a batch has this many (POI, request) pairs
+SCORE_OFFLOAD_MIN_SIZE = int(os.getenv("SCORE_OFFLOAD_MIN_SIZE", 20000))
+
+
+class ScoreBatcher:
+    """
+    Scores concurrent requests for the same city together.
+
+    The first request for a (city, catalog version, threshold) opens a batch; others
+    arriving within `window` seconds join it. The batch is scored with one
+    matrix-matrix product when the window closes or it reaches `max_size`, and each
+    request gets back its own (indices, similarities). A request waits at most
+    `window` seconds for others to join.
+    """
+
+    def __init__(self, window: float, max_size: int):
+        self.window = window
+        self.max_size = max_size
+        self._batches = {}  # key -> (scorer, [(user_vector, future)], timer handle)
+        self._tasks = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.max_size > 1
+
+    async def rank(self, catalog, user_vector, threshold: float):
+        """(indices, similarities) of the catalog's POIs matching the user vector, best first."""
+        scorer = catalog.scorer
+        if not self.enabled:
+            return await run_cpu(
+                rank_pois, scorer.matrix, scorer.norms, user_vector,
+                threshold=threshold, size=len(scorer), min_size=SCORE_OFFLOAD_MIN_SIZE
+            )
+
+        key = (catalog.city, catalog.version, threshold)
+        future = asyncio.get_running_loop().create_future()
+        batch = self._batches.get(key)
+        if batch is None:
+            handle = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+            batch = self._batches[key] = (scorer, [], handle)
+        batch[1].append((np.asarray(user_vector, dtype=np.float32), future))
+        if len(batch[1]) >= self.max_size:
+            self._flush(key)
+        return await future
+
+    def _flush(self, key):
+        scorer, requests, handle = self._batches.pop(key)
+        handle.cancel()
+        SCORE_BATCH_SIZE.observe(len(requests))
+        task = asyncio.create_task(self._score(key, scorer, requests))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _score(self, key, scorer, requests: list):
+        threshold = key[2]
+        try:
+            results = await run_cpu(
+                rank_pois_many, scorer.matrix, scorer.norms, np.stack([vector for vector, _ in requests]),
+                threshold=threshold, size=len(scorer) * len(requests), min_size=SCORE_OFFLOAD_MIN_SIZE
+            )
+        except Exception as e:
+            logging.error(f"Batch scoring failed for {key[0]} ({len(requests)} requests): {str(e)}")
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(requests, results):
+            if not future.done():  # the request may have been cancelled meanwhile
+                future.set_result(result)
+
+
+score_batcher = ScoreBatcher(window=SCORE_BATCH_WINDOW_MS / 1000, max_size=SCORE_BATCH_MAX_SIZE)
@@ -0,0 +1,104 @@
+# backend/components/scoring.py
+import numpy as np
+from data.interests import interests
+
+
+# The array-level functions below take only NumPy arrays, so they can run in a
+# worker process (see components/executor.py) without shipping POI documents.
+
+def similarities(matrix: np.ndarray, norms: np.ndarray, user_vector) -> np.ndarray:
+    """Cosine similarity of every row of `matrix` (with precomputed `norms`) to the user vector."""
+    user_vector = np.asarray(user_vector, dtype=np.float32)
+    user_norm = float(np.linalg.norm(user_vector))
+    if user_norm == 0 or len(matrix) == 0:
+        return np.zeros(len(matrix), dtype=np.float32)
+    dots = matrix @ user_vector
+    denom = norms * user_norm
+    return np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+
+
+def rank_pois(matrix: np.ndarray, norms: np.ndarray, user_vector, k: int = None, threshold: float = 0.3):
+    """
+    Rank POIs by similarity to the user vector.
+
+    Args:
+        matrix: POI x interest matrix, with `norms` its row norms.
+        user_vector: Vector of interest scores, ordered like the matrix columns.
+        k (int): Maximum number of POIs to return; None returns every match.
+        threshold (float): Minimum similarity for a POI to be kept.
+
+    Returns:
+        tuple: (indices, similarities) sorted by descending similarity.
+    """
+    return rank_similarities(similarities(matrix, norms, user_vector), k=k, threshold=threshold)
+
+
+def similarities_many(matrix: np.ndarray, norms: np.ndarray, user_vectors) -> np.ndarray:
+    """Cosine similarities of every POI to each of m user vectors in one matrix product; returns (m, n)."""
+    user_vectors = np.asarray(user_vectors, dtype=np.float32).reshape(-1, matrix.shape[1])
+    user_norms = np.linalg.norm(user_vectors, axis=1)
+    if len(matrix) == 0:
+        return np.zeros((len(user_vectors), 0), dtype=np.float32)
+    dots = user_vectors @ matrix.T
+    denom = user_norms[:, None] * norms[None, :]
+    return np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+
+
+def rank_pois_many(matrix: np.ndarray, norms: np.ndarray, user_vectors, k: int = None, threshold: float = 0.3) -> list:
+    """rank_pois for several user vectors at once; one (indices, similarities) pair per vector."""
+    return [rank_similarities(sims, k=k, threshold=threshold) for sims in similarities_many(matrix, norms, user_vectors)]
+
+
+def rank_similarities(sims: np.ndarray, k: int = None, threshold: float = 0.3):
+    """(indices, similarities) of the POIs at or above the threshold, best first, at most k."""
+    candidates = np.flatnonzero(sims >= threshold)
+    if k is not None and k < len(candidates):
+        # Partial selection keeps this O(n) for large catalogs
+        part = np.argpartition(-sims[candidates], k - 1)[:k]
+        candidates = candidates[part]
+    # Stable sort keeps catalog order among equal similarities
+    order = np.argsort(-sims[candidates], kind="stable")
+    candidates = candidates[order]
+    return candidates, sims[candidates]
+
+
+class POIScorer:
+    """
+    Scores a city's POIs against a user interest vector in one matrix-vector product.
+
+    The POI x interest matrix is stored as float32 together with its row norms, so a
+    request only pays for one normalisation of the user vector and one product.
+    """
+
+    def __init__(self, pois: list, all_interests: list = interests):
+        self.pois = pois
+        self.all_interests = all_interests
+        index = {interest: i for i, interest in enumerate(all_interests)}
+
+        matrix = np.zeros((len(pois), len(all_interests)), dtype=np.float32)
+        for row, poi in enumerate(pois):
+            for interest, score in (poi.get("interests") or {}).items():
+                col = index.get(interest)
+                if col is not None:
+                    matrix[row, col] = score
+        self.matrix = matrix
+        self.norms = np.linalg.norm(matrix, axis=1)
+
+    def __len__(self):
+        return len(self.pois)
+
+    def similarities(self, user_vector) -> np.ndarray:
+        """Cosine similarity of every POI to the user vector (0 for all-zero vectors)."""
+        return similarities(self.matrix, self.norms, user_vector)
+
+    def top_k(self, user_vector, k: int = None, threshold: float = 0.3):
+        """Rank POIs by similarity to the user vector; see rank_pois."""
+        return rank_pois(self.matrix, self.norms, user_vector, k=k, threshold=threshold)
+
+    def take(self, indices, sims) -> list:
+        """Copies of the POIs at `indices` with their 'similarity' field set."""
+        return [{**self.pois[i], "similarity": float(s)} for i, s in zip(indices, sims)]
+
+    def filter(self, user_vector, k: int = None, threshold: float = 0.3) -> list:
+        """Return copies of the matching POIs with a 'similarity' field, best first."""
+        return self.take(*self.top_k(user_vector, k=k, threshold=threshold))
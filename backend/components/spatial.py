@@ -0,0 +1,167 @@
+# backend/components/spatial.py
+import math
+import numpy as np
+from components.distance import EARTH_RADIUS_KM
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+DEFAULT_CELL_KM = 1.0
+CELLS_PER_POINT = 4  # grid resolution is coarsened so the grid never has more cells than this per POI
+
+
+def unit_vectors(lats, lons) -> np.ndarray:
+    """Lat/lon degrees as (n, 3) points on the unit sphere."""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+class SpatialIndex:
+    """
+    Grid index over lat/lon points for radius and k-nearest queries.
+
+    Points are bucketed into roughly square cells of `cell_km` and stored sorted by
+    cell (CSR layout: one offsets array, one permutation), so the cells of a grid
+    row covering a query are one contiguous slice. Candidates are then measured
+    exactly as great-circle distances from unit-sphere chords. Meant for the POIs
+    of one city; points are assumed not to straddle the antimeridian.
+    """
+
+    def __init__(self, lats, lons, cell_km: float = DEFAULT_CELL_KM):
+        lat = np.asarray(lats, dtype=np.float64)
+        lon = np.asarray(lons, dtype=np.float64)
+        self.n = len(lat)
+        self.xyz = unit_vectors(lat, lon)
+        if self.n == 0:
+            return
+
+        self.lat0, self.lon0 = float(lat.min()), float(lon.min())
+        mid_lat = math.radians((lat.min() + lat.max()) / 2)
+        lon_scale = max(math.cos(mid_lat), 0.01)
+        height_km = (lat.max() - self.lat0) * KM_PER_DEGREE
+        width_km = (lon.max() - self.lon0) * KM_PER_DEGREE * lon_scale
+        max_cells = CELLS_PER_POINT * self.n + 64
+        while (height_km // cell_km + 1) * (width_km // cell_km + 1) > max_cells:
+            cell_km *= 2
+        self.cell_km = cell_km
+        self.lat_step = cell_km / KM_PER_DEGREE
+        self.lon_step = self.lat_step / lon_scale
+        self.rows = int((lat.max() - self.lat0) // self.lat_step) + 1
+        self.cols = int((lon.max() - self.lon0) // self.lon_step) + 1
+
+        cells = self._row(lat) * self.cols + self._col(lon)
+        self.order = np.argsort(cells, kind="stable")
+        self.cell_start = np.searchsorted(cells[self.order], np.arange(self.rows * self.cols + 1))
+
+    def __len__(self):
+        return self.n
+
+    def _row(self, lat: np.ndarray) -> np.ndarray:
+        return np.clip(((lat - self.lat0) // self.lat_step).astype(np.intp), 0, self.rows - 1)
+
+    def _col(self, lon: np.ndarray) -> np.ndarray:
+        return np.clip(((lon - self.lon0) // self.lon_step).astype(np.intp), 0, self.cols - 1)
+
+    # Scalar versions for queries, where NumPy's per-call overhead would dominate
+    def _row_of(self, lat: float) -> int:
+        return min(max(int((lat - self.lat0) // self.lat_step), 0), self.rows - 1)
+
+    def _col_of(self, lon: float) -> int:
+        return min(max(int((lon - self.lon0) // self.lon_step), 0), self.cols - 1)
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Indices of every point in the grid cells overlapping the circle's bounding box."""
+        dlat = radius_km / KM_PER_DEGREE
+        lat_lo, lat_hi = lat - dlat, lat + dlat
+        edge_lat = min(max(abs(lat_lo), abs(lat_hi)), 90.0)
+        cos_edge = math.cos(math.radians(edge_lat))
+        dlon = 360.0 if cos_edge < 1e-6 else radius_km / (KM_PER_DEGREE * cos_edge)
+        lon_lo, lon_hi = lon - dlon, lon + dlon
+
+        lat_max = self.lat0 + self.rows * self.lat_step
+        lon_max = self.lon0 + self.cols * self.lon_step
+        if lat_hi < self.lat0 or lat_lo > lat_max or lon_hi < self.lon0 or lon_lo > lon_max:
+            return np.empty(0, dtype=np.intp)
+
+        r0, r1 = self._row_of(lat_lo), self._row_of(lat_hi)
+        c0, c1 = self._col_of(lon_lo), self._col_of(lon_hi)
+        if r0 == 0 and c0 == 0 and r1 == self.rows - 1 and c1 == self.cols - 1:
+            return self.order
+        cell_start, order, cols = self.cell_start, self.order, self.cols
+        if r0 == r1:
+            return order[cell_start[r0 * cols + c0]:cell_start[r0 * cols + c1 + 1]]
+        return np.concatenate([
+            order[cell_start[row * cols + c0]:cell_start[row * cols + c1 + 1]]
+            for row in range(r0, r1 + 1)
+        ])
+
+    def _distances(self, point: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        diff = self.xyz[indices] - point
+        chord = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+        return (2 * EARTH_RADIUS_KM) * np.arcsin(np.minimum(chord / 2, 1.0))
+
+    def query(self, lat: float, lon: float, k: int = None, radius_km: float = None, mask: np.ndarray = None):
+        """
+        Points nearest to (lat, lon), nearest first.
+
+        Args:
+            k (int): Maximum number of points to return.
+            radius_km (float): Only return points within this distance.
+            mask (np.ndarray): Optional boolean array; only points where it is True are returned.
+
+        Returns:
+            tuple: (indices, distances_km). At least one of `k` and `radius_km` is required.
+        """
+        if k is None and radius_km is None:
+            raise ValueError("Either k or radius_km is required")
+        if self.n == 0 or (k is not None and k <= 0):
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        lat_rad, lon_rad = math.radians(lat), math.radians(lon)
+        point = np.array([math.cos(lat_rad) * math.cos(lon_rad), math.cos(lat_rad) * math.sin(lon_rad), math.sin(lat_rad)])
+
+        if radius_km is not None:
+            indices = self._candidates(lat, lon, radius_km)
+            if mask is not None:
+                indices = indices[mask[indices]]
+            distances = self._distances(point, indices)
+            within = distances <= radius_km
+            return self._nearest(indices[within], distances[within], k)
+
+        # k nearest: widen the search until the k-th nearest candidate lies inside the
+        # searched radius, which guarantees no closer point was left outside it
+        radius_km = self.cell_km
+        while True:
+            indices = self._candidates(lat, lon, radius_km)
+            searched_all = len(indices) == self.n
+            if mask is not None:
+                indices = indices[mask[indices]]
+            if len(indices) >= k or searched_all:
+                distances = self._distances(point, indices)
+                indices, distances = self._nearest(indices, distances, k)
+                if searched_all or distances[-1] <= radius_km:
+                    return indices, distances
+            radius_km *= 2
+
+    @staticmethod
+    def _nearest(indices: np.ndarray, distances: np.ndarray, k: int = None):
+        if k is not None and k < len(indices):
+            part = np.argpartition(distances, k - 1)[:k]
+            indices, distances = indices[part], distances[part]
+        order = np.argsort(distances, kind="stable")
+        return indices[order], distances[order]
+
+
+def nearby_pois(catalog, lat: float, lon: float, k: int = 10, radius_km: float = None,
+                interest: str = None, min_score: float = 0.0) -> list:
+    """
+    The POIs of a catalog closest to a point, optionally within a radius and with a minimum interest score.
+
+    Returns copies of the POIs with a 'distance_km' field, nearest first.
+    """
+    mask = None
+    if interest is not None:
+        col = catalog.scorer.all_interests.index(interest)
+        mask = catalog.scorer.matrix[:, col] >= min_score
+    indices, distances = catalog.spatial.query(lat, lon, k=k, radius_km=radius_km, mask=mask)
+    return [{**catalog.pois[i], "distance_km": round(float(d), 3)} for i, d in zip(indices.tolist(), distances.tolist())]
@@ -0,0 +1,85 @@
+# backend/components/stream_parser.py
+import json
+import logging
+import re
+
+PLAN_ARRAY_START = re.compile(r'"plan"\s*:\s*\[')
+
+
+class IncrementalPlanParser:
+    """
+    Pulls complete day objects out of a plan JSON document while it is still streaming.
+
+    Feed the text chunks as they arrive; each call returns (index, day) for the day
+    objects of the "plan" array that were completed by that chunk, where index is the
+    object's 0-based position in the array, so an unparseable object does not shift
+    the ones after it. Text outside the array (code fences, the "Hotel" field) is
+    ignored, the full document is parsed separately.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0  # next character to scan
+        self.in_array = False
+        self.done = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.object_start = None
+        self.index = 0  # position in the array of the next day object
+
+    def feed(self, chunk: str) -> list:
+        self.buffer += chunk
+        days = []
+        if self.done:
+            return days
+
+        if not self.in_array:
+            match = PLAN_ARRAY_START.search(self.buffer, self.pos)
+            if not match:
+                # Keep scanning from near the end, in case the key is split across chunks
+                self.pos = max(self.pos, len(self.buffer) - 32)
+                return days
+            self.in_array = True
+            self.pos = match.end()
+
+        buffer = self.buffer
+        for i in range(self.pos, len(buffer)):
+            char = buffer[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                if self.depth == 0 and char == "{":
+                    self.object_start = i
+                self.depth += 1
+            elif char in "}]":
+                if self.depth == 0:
+                    # End of the "plan" array
+                    self.done = True
+                    self.pos = i + 1
+                    return days
+                self.depth -= 1
+                if self.depth == 0 and self.object_start is not None:
+                    day = self._parse_day(buffer[self.object_start:i + 1])
+                    if day is not None:
+                        days.append((self.index, day))
+                    self.index += 1
+                    self.object_start = None
+        self.pos = len(buffer)
+        return days
+
+    @staticmethod
+    def _parse_day(text: str):
+        try:
+            day = json.loads(text)
+        except json.JSONDecodeError as e:
+            logging.warning(f"Skipping unparseable streamed day object: {str(e)}")
+            return None
+        return day if isinstance(day, dict) else None
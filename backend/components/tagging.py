@@ -0,0 +1,304 @@
+# backend/components/tagging.py
+import asyncio
+import json
+import logging
+import os
+from tenacity import AsyncRetrying, retry_if_not_exception_type, stop_after_attempt, wait_random_exponential
+from data.interests import interests
+from components.rate_limiter import AsyncTokenBucket
+from components.response import clean_gemini_response
+from components.clients import get_genai
+from components.metrics import RETRIES, FALLBACKS, EXTERNAL_ERRORS
+
+TAGGING_MODEL = "gemini-1.5-flash"
+
+# Shared across every tagging call in the process so the total stays inside the Gemini quota
+gemini_limiter = AsyncTokenBucket(
+    rate=float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", 15)) / 60,
+    capacity=float(os.getenv("GEMINI_BURST", 5))
+)
+TAGGING_CONCURRENCY = int(os.getenv("GEMINI_TAGGING_CONCURRENCY", 4))
+
+# Rough token accounting used to size batches against max_output_tokens and the
+# whole request (prompt + response) against GEMINI_TAGGING_TOKEN_BUDGET
+CHARS_PER_TOKEN = 4
+OUTPUT_TOKEN_SAFETY = 0.6
+TAGGING_TOKEN_BUDGET = int(os.getenv("GEMINI_TAGGING_TOKEN_BUDGET", 8000))
+
+fallback_mapping = {
+    "SIGHTSEEING": {"Historical": 0.8, "Art & Culture": 0.6},
+    "MUSEUM": {"Historical": 0.8, "Art & Culture": 0.8},
+    "PARK": {"Nature": 0.8, "Relaxing": 0.6},
+    "SHOPPING": {"Shopping": 0.8},
+    "ENTERTAINMENT": {"Entertainment": 0.8},
+    "BEACH": {"Nature": 0.8, "Relaxing": 0.7},
+    "SPORT": {"Sports": 0.8},
+    "ADVENTURE": {"Adventure": 0.8},
+    "HISTORIC": {"Historical": 0.9, "Art & Culture": 0.5},
+    "LANDMARK": {"Historical": 0.8, "Art & Culture": 0.6},
+    "MONUMENT": {"Historical": 0.9, "Art & Culture": 0.4}
+}
+
+
+def fallback_interests(category: str) -> dict:
+    """Category-based interests used when Gemini cannot tag a POI."""
+    FALLBACKS.labels("interest_mapping").inc()
+    return dict(fallback_mapping.get(category, {"Entertainment": 0.5}))
+
+
+def normalize_interests(raw_interests: dict) -> dict:
+    normalized_interests = {}
+    for interest, score in raw_interests.items():
+        normalized_interest = interest.replace("ArtAndCulture", "Art & Culture")
+        if normalized_interest in interests:
+            normalized_interests[normalized_interest] = max(0.0, min(1.0, float(score)))
+    return normalized_interests
+
+
+class IncompleteResponseError(ValueError):
+    """Gemini answered, but the output was truncated or did not cover the whole batch."""
+
+
+def _batch_prompt(batch: list) -> str:
+    prompt = (
+        "Classify the following points of interest into one or more of these interests: "
+        f"{', '.join(interests)}. Assign a score between 0 and 1 for each interest based on relevance. "
+        "Return the result as a JSON array where each element is an object with 'name', 'category', and 'interests' (a dictionary of interest names and scores).\n"
+    )
+    for poi in batch:
+        prompt += _prompt_line(poi)
+    return prompt
+
+
+def _prompt_line(poi: dict) -> str:
+    return f"- Name: {poi['name']}, Category: {poi['category']}\n"
+
+
+def _tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class AdaptiveBatcher:
+    """
+    Sizes tagging batches from an estimate of the tokens each POI adds.
+
+    A batch's estimated response must fit max_output_tokens, and its prompt plus
+    response must fit the total `token_budget`. The largest batch size known to work
+    is remembered per model: it is halved when a response comes back truncated and
+    grows back by one after each full-size success.
+    """
+
+    def __init__(self, max_batch_size: int = 10, token_budget: int = TAGGING_TOKEN_BUDGET):
+        self.max_batch_size = max_batch_size
+        self.token_budget = token_budget
+        self._model_batch_sizes = {}
+
+    @staticmethod
+    def estimate_response_tokens(poi: dict) -> int:
+        entry = {"name": poi["name"], "category": poi["category"], "interests": {interest: 0.55 for interest in interests}}
+        return _tokens(json.dumps(entry, indent=4))
+
+    @staticmethod
+    def estimate_prompt_tokens(poi: dict) -> int:
+        return _tokens(_prompt_line(poi))
+
+    def batch_size_for(self, model: str) -> int:
+        return self._model_batch_sizes.get(model, self.max_batch_size)
+
+    def make_batches(self, pois: list, model: str, max_output_tokens: int) -> list:
+        """Pack POIs in order into batches that fit the token budgets and the remembered size."""
+        output_budget = max_output_tokens * OUTPUT_TOKEN_SAFETY
+        total_budget = self.token_budget * OUTPUT_TOKEN_SAFETY
+        header = _tokens(_batch_prompt([]))
+        size_cap = self.batch_size_for(model)
+        batches, batch, output, total = [], [], 0, header
+        for poi in pois:
+            response_tokens = self.estimate_response_tokens(poi)
+            tokens = response_tokens + self.estimate_prompt_tokens(poi)
+            if batch and (len(batch) >= size_cap or output + response_tokens > output_budget or total + tokens > total_budget):
+                batches.append(batch)
+                batch, output, total = [], 0, header
+            batch.append(poi)
+            output += response_tokens
+            total += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def record_success(self, model: str, size: int):
+        current = self.batch_size_for(model)
+        if size >= current and current < self.max_batch_size:
+            self._model_batch_sizes[model] = current + 1
+
+    def record_failure(self, model: str, size: int):
+        new_size = max(1, min(self.batch_size_for(model), size // 2))
+        if new_size != self.batch_size_for(model):
+            logging.info(f"Reducing tagging batch size for {model} to {new_size}")
+        self._model_batch_sizes[model] = new_size
+
+
+batcher = AdaptiveBatcher(max_batch_size=int(os.getenv("GEMINI_TAGGING_MAX_BATCH_SIZE", 10)))
+
+
+def _retrying(label: str, retries: int, delay: float) -> AsyncRetrying:
+    """
+    Retry policy: jittered exponential backoff that sleeps with asyncio, never time.sleep.
+
+    Incomplete responses are not retried, since sending the same batch again
+    usually truncates again; the batch is split instead.
+    """
+    def log_retry(retry_state):
+        logging.error(f"Error {label} (attempt {retry_state.attempt_number}/{retries}): {retry_state.outcome.exception()}")
+        RETRIES.labels("gemini").inc()
+
+    return AsyncRetrying(
+        stop=stop_after_attempt(retries),
+        wait=wait_random_exponential(multiplier=delay, max=delay * 8),
+        retry=retry_if_not_exception_type(IncompleteResponseError),
+        before_sleep=log_retry,
+        reraise=True
+    )
+
+
+async def _generate(prompt: str, max_output_tokens: int) -> str:
+    await gemini_limiter.acquire()
+    model = get_genai().GenerativeModel(TAGGING_MODEL)
+    try:
+        response = await model.generate_content_async(
+            prompt,
+            generation_config={
+                "max_output_tokens": max_output_tokens,
+                "temperature": 0.5
+            }
+        )
+    except Exception:
+        EXTERNAL_ERRORS.labels("gemini").inc()
+        raise
+    if _hit_token_limit(response):
+        raise IncompleteResponseError("Gemini stopped at max_output_tokens")
+    return response.text
+
+
+def _hit_token_limit(response) -> bool:
+    try:
+        reason = response.candidates[0].finish_reason
+    except (AttributeError, IndexError):
+        return False
+    return getattr(reason, "name", None) == "MAX_TOKENS"
+
+
+async def _request_batch_tags(batch: list, batch_no, max_output_tokens: int) -> list:
+    prompt = _batch_prompt(batch)
+    logging.info(f"Gemini prompt for batch tagging (batch {batch_no}): {prompt}")
+    result = await _generate(prompt, max_output_tokens)
+    logging.info(f"Gemini response for batch tagging (raw, batch {batch_no}): {result}")
+
+    cleaned_result = clean_gemini_response(result)
+    if not cleaned_result or not (cleaned_result.startswith("[") and cleaned_result.endswith("]")):
+        logging.warning(f"Incomplete Gemini response for batch {batch_no}: {cleaned_result}")
+        raise IncompleteResponseError("Gemini response is incomplete or not a JSON array")
+
+    try:
+        tagged_pois = json.loads(cleaned_result)
+    except json.JSONDecodeError as e:
+        logging.error(f"Failed to parse Gemini response as JSON (batch {batch_no}): {cleaned_result}")
+        raise IncompleteResponseError(f"Invalid JSON response from Gemini: {str(e)}")
+
+    if len(tagged_pois) != len(batch):
+        logging.warning(f"Expected {len(batch)} POIs in response, but got {len(tagged_pois)}: {tagged_pois}")
+        raise IncompleteResponseError("Incomplete response: Number of tagged POIs does not match batch size")
+
+    interests_dicts = []
+    for tagged_poi in tagged_pois:
+        if "name" not in tagged_poi or "category" not in tagged_poi or "interests" not in tagged_poi:
+            logging.error(f"Invalid tagged POI in batch {batch_no}: {tagged_poi}")
+            raise IncompleteResponseError("Tagged POI missing required fields")
+        interests_dicts.append(normalize_interests(tagged_poi.get("interests", {})))
+    return interests_dicts
+
+
+async def _tag_batch(batch: list, batch_no: str, retries: int, delay: float, max_output_tokens: int) -> list:
+    logging.info(f"Processing batch {batch_no} with {len(batch)} POIs")
+    try:
+        async for attempt in _retrying(f"batch tagging POIs (batch {batch_no})", retries, delay):
+            with attempt:
+                interests_dicts = await _request_batch_tags(batch, batch_no, max_output_tokens)
+        batcher.record_success(TAGGING_MODEL, len(batch))
+        return interests_dicts
+    except Exception as e:
+        logging.error(f"Error batch tagging POIs (batch {batch_no}): {str(e)}")
+        if not isinstance(e, IncompleteResponseError):
+            # Rate limits, quota and network errors say nothing about the batch size, and
+            # splitting would only spend more of the request budget, so use the fallback
+            logging.warning(f"Using fallback interests for batch {batch_no} after a non-size error")
+            return [fallback_interests(poi["category"]) for poi in batch]
+        if len(batch) == 1:
+            poi = batch[0]
+            logging.info(f"Falling back to individual tagging for POI: {poi['name']}")
+            return [await tag_poi_with_interests(poi["name"], poi["category"], retries=retries, delay=delay)]
+
+        # Split in half rather than dropping straight to one call per POI
+        batcher.record_failure(TAGGING_MODEL, len(batch))
+        FALLBACKS.labels("tagging_batch_split").inc()
+        mid = len(batch) // 2
+        logging.warning(f"Splitting batch {batch_no} into batches of {mid} and {len(batch) - mid} POIs")
+        left, right = await asyncio.gather(
+            _tag_batch(batch[:mid], f"{batch_no}a", retries, delay, max_output_tokens),
+            _tag_batch(batch[mid:], f"{batch_no}b", retries, delay, max_output_tokens)
+        )
+        return left + right
+
+
+async def tag_pois_with_interests(pois: list, retries=3, delay=1, max_output_tokens=4000):
+    """
+    Tag POIs with interest scores using Gemini.
+
+    Batches are sized by the adaptive batcher, run concurrently (at most
+    GEMINI_TAGGING_CONCURRENCY at a time) and every Gemini call goes through the
+    shared token bucket. Results keep the input order.
+    """
+    semaphore = asyncio.Semaphore(TAGGING_CONCURRENCY)
+
+    async def run(batch, batch_no):
+        async with semaphore:
+            return await _tag_batch(batch, str(batch_no), retries, delay, max_output_tokens)
+
+    batches = batcher.make_batches(pois, TAGGING_MODEL, max_output_tokens)
+    results = await asyncio.gather(*(run(batch, n) for n, batch in enumerate(batches, start=1)))
+    return [interests_dict for batch_result in results for interests_dict in batch_result]
+
+
+async def _request_poi_tags(poi_name: str, category: str, max_output_tokens: int) -> dict:
+    prompt = (
+        f"Given the point of interest '{poi_name}' with category '{category}', classify it into one or more of these interests: "
+        f"{', '.join(interests)}. Assign a score between 0 and 1 for each interest based on relevance. "
+        f"Return the result as a JSON object with interest names as keys and scores as values."
+    )
+    logging.info(f"Gemini prompt for individual tagging of '{poi_name}': {prompt}")
+    result = await _generate(prompt, max_output_tokens)
+    logging.info(f"Gemini response for individual tagging of '{poi_name}' (raw): {result}")
+
+    cleaned_result = clean_gemini_response(result)
+    if not cleaned_result or not (cleaned_result.startswith("{") and cleaned_result.endswith("}")):
+        logging.warning(f"Incomplete Gemini response for '{poi_name}': {cleaned_result}")
+        raise ValueError("Gemini response is incomplete or not a JSON object")
+
+    try:
+        interests_dict = json.loads(cleaned_result)
+    except json.JSONDecodeError as e:
+        logging.error(f"Failed to parse Gemini response as JSON for '{poi_name}': {cleaned_result}")
+        raise ValueError(f"Invalid JSON response from Gemini: {str(e)}")
+    return normalize_interests(interests_dict)
+
+
+async def tag_poi_with_interests(poi_name: str, category: str, retries=3, delay=1, max_output_tokens=400):
+    try:
+        async for attempt in _retrying(f"tagging POI '{poi_name}' with Gemini", retries, delay):
+            with attempt:
+                return await _request_poi_tags(poi_name, category, max_output_tokens)
+    except Exception as e:
+        logging.error(f"Error tagging POI '{poi_name}' with Gemini (attempt {retries}/{retries}): {str(e)}")
+        logging.warning(f"Max retries reached for POI '{poi_name}', using fallback")
+        interests_dict = fallback_interests(category)
+        logging.info(f"Fallback interests for POI '{poi_name}' (category: {category}): {interests_dict}")
+        return interests_dict
@@ -0,0 +1,84 @@
+# backend/components/timing.py
+import asyncio
+import weakref
+from contextvars import ContextVar
+
+# Stage durations of the current request, as (stage, seconds) in completion order. The
+# list is shared with tasks started by the request (e.g. the hotel lookup), since
+# they copy the context and so see the same list.
+_request_timings: ContextVar = ContextVar("request_timings", default=None)
+
+
+# Stages open in each asyncio task, innermost last. Keyed by task rather than held in
+# a contextvar so the loop monitor's watchdog thread can look up the running task's stage.
+_task_stages = weakref.WeakKeyDictionary()
+
+
+def start_request_timing():
+    """Start collecting stage timings for the current request; pass the result to end_request_timing."""
+    return _request_timings.set([])
+
+
+def end_request_timing(token):
+    _request_timings.reset(token)
+
+
+def record_stage(stage: str, seconds: float):
+    """Add a stage duration to the current request, if one is being timed."""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+def _current_task():
+    try:
+        return asyncio.current_task()
+    except RuntimeError:  # not on an event loop thread
+        return None
+
+
+def enter_stage(stage: str):
+    """Mark `stage` as open in the current task; pass the result to exit_stage."""
+    task = _current_task()
+    if task is not None:
+        _task_stages.setdefault(task, []).append(stage)
+    return task
+
+
+def exit_stage(task):
+    stages = _task_stages.get(task) if task is not None else None
+    if stages:
+        stages.pop()
+
+
+def task_stage(task):
+    """The innermost stage open in `task`, or None. Safe to call from another thread."""
+    try:
+        return _task_stages.get(task, [])[-1]
+    except (IndexError, TypeError):
+        return None
+
+
+def request_timings() -> dict:
+    """Per-stage totals for the current request: {stage: {"ms": total, "count": calls}}, in first-seen order."""
+    summary = {}
+    for stage, seconds in _request_timings.get() or []:
+        entry = summary.setdefault(stage, {"ms": 0.0, "count": 0})
+        entry["ms"] += seconds * 1000
+        entry["count"] += 1
+    for entry in summary.values():
+        entry["ms"] = round(entry["ms"], 2)
+    return summary
+
+
+def server_timing_header(timings: dict, total_ms: float = None) -> str:
+    """Format stage totals as a Server-Timing header value, e.g. 'gemini;dur=812.4, score;dur=0.6'."""
+    metrics = []
+    for stage, entry in timings.items():
+        metric = f"{stage};dur={entry['ms']}"
+        if entry["count"] > 1:
+            metric += f';desc="{entry["count"]} calls"'
+        metrics.append(metric)
+    if total_ms is not None:
+        metrics.append(f"total;dur={round(total_ms, 2)}")
+    return ", ".join(metrics)
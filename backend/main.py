@@ -1,139 +1,171 @@
 # backend/main.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from components.models import PlanRequest, EditPlanRequest
-from utils import fetch_pois
-from openai import OpenAI
-import google.generativeai as genai
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+import asyncio
 import os
-import pymongo
-from pymongo.read_concern import ReadConcern
-from pymongo.write_concern import WriteConcern
 import logging
+import time
 from bson.objectid import ObjectId
 from datetime import datetime
-from sklearn.metrics.pairwise import cosine_similarity
 import traceback
-from amadeus import Client, ResponseError  # Import Amadeus SDK
+import json
+from amadeus import ResponseError  # Import Amadeus SDK
 from datetime import datetime, timedelta
+
+# Load environment variables before the components read their settings at import
+load_dotenv()
+
 # Import components
-from components.vector import interests_to_vector
-from components.plan_generator import generate_plan_with_gemini
-from components.clustering import cluster_pois
+from components import repository
+from components.pipeline import run_plan_pipeline, plan_pipeline_events, store_stage, validate_stage
+from components.hotels import get_city_hotels, rank_hotels
+from components.jobs import plan_jobs, QueueFullError
+from components import http_client
+from components.spatial import nearby_pois
+from components.metrics import render_metrics, FALLBACKS
+from components.timing import start_request_timing, end_request_timing, request_timings, server_timing_header
+from components.profiling import profiling_middleware, has_profile_token
+from components.loop_monitor import loop_monitor
+from components.executor import plan_executor
+from utils import fetch_poi_catalog
+from data.interests import interests
 from data.cities import city_coordinates
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Load environment variables
-load_dotenv()
 logging.info(f"Loaded environment variables")
 
+# Candidate hotels considered by /hotels/search, and how many offer batches run at once
+HOTEL_SEARCH_POOL_SIZE = int(os.getenv("HOTEL_SEARCH_POOL_SIZE", 50))
+HOTEL_SEARCH_CONCURRENCY = int(os.getenv("HOTEL_SEARCH_CONCURRENCY", 4))
+
+async def warm_up_mongo():
+    # Test MongoDB connection; a failure is logged rather than blocking startup
+    try:
+        await repository.ping()
+    except Exception as e:
+        logging.error(f"MongoDB Atlas connection failed, requests that need it will fail until it is reachable: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Third-party clients (Amadeus, Gemini, OpenAI, MongoDB, HTTP) are created on first
+    # use, so startup only kicks off a background connection check and the job workers
+    warm_up = asyncio.create_task(warm_up_mongo())
+    await loop_monitor.start()
+    await plan_jobs.start()
+    yield
+    warm_up.cancel()
+    await plan_jobs.stop()
+    await loop_monitor.stop()
+    # Waiting for the workers to exit would otherwise block the loop
+    await asyncio.to_thread(plan_executor.shutdown)
+    await http_client.close_http_client()
+    repository.close()
+
 # Initialize FastAPI app
-app = FastAPI()
-
-# Initialize MongoDB client
-mongo_client = pymongo.MongoClient(os.getenv("MONGO_URI"))
-db = mongo_client["trip_planner"]
-
-# Set write_concern and read_concern for the plans collection
-db.plans = db["plans"].with_options(
-    write_concern=WriteConcern(w="majority"),
-    read_concern=ReadConcern("majority")
-)
-
-# Test MongoDB connection
-try:
-    mongo_client.server_info()
-    logging.info("MongoDB Atlas connection successful")
-except Exception as e:
-    logging.error(f"MongoDB Atlas connection failed: {str(e)}")
-    raise
-
-# Initialize Amadeus client
-amadeus = Client(
-    client_id=os.getenv("AMADEUS_API_KEY"),
-    client_secret=os.getenv("AMADEUS_API_SECRET"),
-    hostname="test"
-)
-
-# Initialize OpenAI client (not used for now)
-openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-# Initialize Gemini client
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    # Every stage_timer that runs for this request also lands in its Server-Timing header.
+    # Streaming responses only report the stages finished before the stream started.
+    token = start_request_timing()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+        response.headers["Server-Timing"] = server_timing_header(request_timings(), (time.perf_counter() - start) * 1000)
+        return response
+    finally:
+        end_request_timing(token)
+
+# Opt-in cProfile of single requests (PROFILE_TOKEN), see components/profiling.py
+app.middleware("http")(profiling_middleware)
 
 # Endpoints
 @app.post("/generate-plan")
-async def generate_plan(request: PlanRequest):
+async def generate_plan(request: PlanRequest, use_cache: bool = True, debug: bool = False):
     try:
-        city_info = city_coordinates.get(request.location)
-        if not city_info:
-            raise HTTPException(status_code=400, detail="Unsupported location")
-
-        pois = await fetch_pois(city_info["iata"])
-        logging.info(f"Fetched POIs for {request.location}: {pois}")
-
-        user_vector = interests_to_vector(request.interests)
-        logging.info(f"User interests vector: {user_vector}")
-
-        # Filter POIs based on user interests
-        filtered_pois = []
-        similarity_threshold = 0.3
-        for poi in pois:
-            poi_interests = poi.get("interests", {})
-            logging.info(f"POI {poi['name']} interests: {poi_interests}")
-            poi_vector = interests_to_vector(poi_interests)
-            logging.info(f"POI {poi['name']} vector: {poi_vector}")
-            similarity = cosine_similarity([user_vector], [poi_vector])[0][0]
-            logging.info(f"Similarity between user and POI {poi['name']}: {similarity}")
-            if similarity >= similarity_threshold:
-                poi["similarity"] = similarity
-                filtered_pois.append(poi)
-
-        filtered_pois.sort(key=lambda x: x["similarity"], reverse=True)
-        logging.info(f"Filtered POIs: {filtered_pois}")
-
-        if not filtered_pois:
-            raise HTTPException(status_code=404, detail="No points of interest match your preferences")
-
-        # Cluster POIs and assign to days
-        daily_pois = cluster_pois(filtered_pois, days=request.days)
-        logging.info(f"Daily POIs (names only for logging): {[[poi['name'] for poi in cluster] for cluster in daily_pois]}")
-        logging.info(f"Daily POIs (full structure): {daily_pois}")
-
-        # Generate the plan with Gemini
-        try:
-            plan_data = await generate_plan_with_gemini(
-                request.location,
-                request.start_date,
-                request.days,
-                request.interests,
-                request.budget,
-                daily_pois
-            )
-        except ValueError as e:
-            raise HTTPException(status_code=500, detail=f"Failed to generate plan: {str(e)}")
-
-        plan_doc = {
-            "location": request.location,
-            "start_date": request.start_date,
-            "days": request.days,
-            "interests": request.interests,
-            "budget": request.budget,
-            "plan": plan_data["plan"],
-            "hotel": plan_data["Hotel"]
-        }
-        result = db.plans.insert_one(plan_doc)
-        plan_id = str(result.inserted_id)
-        logging.info(f"Stored plan with plan_id: {plan_id}")
-
-        return {"plan_id": plan_id, "plan": plan_data}
+        plan_data = await run_plan_pipeline(request, use_cache=use_cache)
+        plan_id = await store_stage(request, plan_data)
+
+        response = {"plan_id": plan_id, "plan": plan_data}
+        if debug:
+            response["debug"] = {"timings": request_timings()}
+        return response
+    except HTTPException:
+        # Stage errors already carry their status (400 bad input, 404 no matching POIs, ...)
+        raise
     except Exception as e:
         logging.error(f"Error in /generate-plan: {str(e)}")
         logging.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error generating plan: {str(e)}")
 
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.post("/generate-plan/stream")
+async def generate_plan_stream(request: PlanRequest, use_cache: bool = True):
+    """Server-Sent Events variant of /generate-plan: stage events, then each day as Gemini writes it."""
+    # Reject bad requests with a normal status code before the stream starts
+    validate_stage(request)
+
+    async def events():
+        try:
+            async for event, data in plan_pipeline_events(request, use_cache=use_cache, stream_days=True):
+                if event == "plan":
+                    plan_id = await store_stage(request, data)
+                    yield sse_event("done", {"plan_id": plan_id, "plan": data})
+                else:
+                    yield sse_event(event, data)
+        except HTTPException as e:
+            logging.error(f"Error in /generate-plan/stream: {e.detail}")
+            yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logging.error(f"Error in /generate-plan/stream: {str(e)}")
+            logging.error(traceback.format_exc())
+            yield sse_event("error", {"status_code": 500, "detail": f"Error generating plan: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/plan-jobs", status_code=202)
+async def create_plan_job(request: PlanRequest, priority: int = 0, use_cache: bool = True):
+    """Queue a plan for background generation; poll /plan-jobs/{job_id} for its status."""
+    validate_stage(request)
+    try:
+        job_id = await plan_jobs.submit(request, priority=priority, use_cache=use_cache)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/plan-jobs/{job_id}")
+async def get_plan_job(job_id: str):
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job_id")
+
+    job = await repository.find_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "stage": job.get("stage"),
+        "priority": job.get("priority", 0),
+        "plan_id": job.get("plan_id"),
+        "error": job.get("error"),
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at")
+    }
+
 @app.get("/get-plan")
 async def get_plan(plan_id: str):
     try:
@@ -142,7 +174,7 @@ async def get_plan(plan_id: str):
             raise HTTPException(status_code=400, detail="Invalid plan_id")
 
         # Fetch the plan
-        plan = db.plans.find_one({"_id": ObjectId(plan_id)})
+        plan = await repository.find_plan(plan_id)
         if not plan:
             raise HTTPException(status_code=404, detail="Plan not found")
 
@@ -171,7 +203,7 @@ async def edit_plan(plan_id: str, request: EditPlanRequest):
             raise HTTPException(status_code=400, detail="Invalid plan_id")
 
         # Fetch the existing plan
-        plan = db.plans.find_one({"_id": ObjectId(plan_id)})
+        plan = await repository.find_plan(plan_id)
         if not plan:
             raise HTTPException(status_code=404, detail="Plan not found")
 
@@ -283,14 +315,11 @@ async def edit_plan(plan_id: str, request: EditPlanRequest):
             return {"plan_id": plan_id, "plan": {"plan": plan["plan"], "Hotel": plan["hotel"]}}
 
         # Update the plan in MongoDB
-        result = db.plans.update_one(
-            {"_id": ObjectId(plan_id)},
-            {"$set": update_data}
-        )
+        result = await repository.update_plan(plan_id, update_data)
         logging.info(f"Updated plan with plan_id: {plan_id}, matched: {result.matched_count}, modified: {result.modified_count}")
 
         # Fetch the updated plan
-        updated_plan = db.plans.find_one({"_id": ObjectId(plan_id)})
+        updated_plan = await repository.find_plan(plan_id)
         logging.info(f"Updated plan from DB: {updated_plan}")
 
         return {
@@ -306,7 +335,7 @@ async def edit_plan(plan_id: str, request: EditPlanRequest):
         raise HTTPException(status_code=500, detail=f"Error editing plan: {str(e)}")
 
 @app.get("/hotels/search")
-async def search_hotels(location: str, checkin: str, checkout: str):
+async def search_hotels(location: str, checkin: str, checkout: str, debug: bool = False):
     try:
         # Validate dates
         try:
@@ -337,99 +366,36 @@ async def search_hotels(location: str, checkin: str, checkout: str):
 
         # Step 1: Use Hotel List API to get hotel IDs for the city
         desired_hotel_count = 3  # We want exactly 3 hotels
-        hotels_list = []
 
         # Fetch hotels from Hotel List API (without optional parameters for now)
         try:
-            hotel_list_response = amadeus.reference_data.locations.hotels.by_city.get(
-                cityCode=city_code
-            )
+            hotels_list = await get_city_hotels(city_code)
         except ResponseError as e:
             logging.error(f"Amadeus Hotel List API error: {str(e)}")
             logging.error(f"Full error response: {e.response.body if e.response else 'No response body'}")
             raise HTTPException(status_code=500, detail=f"Hotel List API failed: {str(e)}")
 
-        hotels_list = hotel_list_response.data
         if not hotels_list:
             raise HTTPException(status_code=404, detail="No hotels found for this location in Hotel List API")
 
-        # Create a mapping of hotel IDs to their ratings
-        hotel_ratings_map = {hotel["hotelId"]: hotel.get("rating", 0) for hotel in hotels_list}
-        logging.info(f"Hotel ratings map: {hotel_ratings_map}")
-
-        # Extract hotel IDs (limit to first 10 to match Amadeus API capability)
-        hotel_ids = [hotel["hotelId"] for hotel in hotels_list[:10]]
-        logging.info(f"Retrieved hotel IDs: {hotel_ids}")
-
-        # Step 2: Use Hotel Search API to get offers for the retrieved hotel IDs
-        formatted_hotels = []
-        start_idx = 0
-        batch_size = 10  # Maximum number of hotel IDs per API call
-
-        while start_idx < len(hotel_ids) and len(formatted_hotels) < desired_hotel_count:
-            # Take the next batch of hotel IDs
-            batch_ids = hotel_ids[start_idx:start_idx + batch_size]
-            if not batch_ids:
-                break
-
-            try:
-                response = amadeus.shopping.hotel_offers_search.get(
-                    hotelIds=",".join(batch_ids),
-                    checkInDate=checkin,
-                    checkOutDate=checkout,
-                    adults=2,
-                    currency="USD"
-                )
-                logging.info(f"Hotel Search API response: {response.data}")
-            except ResponseError as e:
-                logging.error(f"Amadeus Hotel Search API error: {str(e)}")
-                logging.error(f"Error details: {e.response.body if e.response else 'No response body'}")
-                start_idx += batch_size
-                continue
-
-            hotels = response.data
-            if not hotels:
-                start_idx += batch_size
-                continue
-
-            # Format the hotels from this batch
-            for hotel in hotels:
-                hotel_info = hotel.get("hotel", {})
-                hotel_id = hotel_info.get("hotelId")
-                offer = hotel.get("offers", [{}])[0]
-                price = offer.get("price", {}).get("total", "N/A")
-                rating = hotel_ratings_map.get(hotel_id, 0)
-
-                # Convert price to a float for scoring (handle "N/A" case)
-                price_value = float(price) if price != "N/A" else float("inf")
-
-                # Calculate a match score: higher rating is better, lower price is better
-                weight_rating = 100
-                weight_price = 0.1
-                score = (float(rating) * weight_rating) - (price_value * weight_price)
-
-                formatted_hotels.append({
-                    "name": hotel_info.get("name", "Unknown Hotel"),
-                    "price": f"${price}" if price != "N/A" else "N/A",
-                    "rating": rating,
-                    "score": score
-                })
-
-                if len(formatted_hotels) >= desired_hotel_count:
-                    break
-
-            start_idx += batch_size
+        # Step 2: Fetch offers for a pool of candidates concurrently and rank them all
+        top_hotels = await rank_hotels(
+            hotels_list,
+            checkin,
+            checkout,
+            k=desired_hotel_count,
+            pool_size=HOTEL_SEARCH_POOL_SIZE,
+            max_concurrency=HOTEL_SEARCH_CONCURRENCY
+        )
+        logging.info(f"Top hotels: {top_hotels}")
 
-        if not formatted_hotels:
+        if not top_hotels:
             raise HTTPException(status_code=404, detail="No hotels found for this location with available offers")
 
-        # Sort hotels by score (descending) and take the top 3
-        formatted_hotels.sort(key=lambda x: x["score"], reverse=True)
-        top_hotels = formatted_hotels[:desired_hotel_count]
-
         # If fewer than 3 hotels are found, add mock hotels to reach 3
         if len(top_hotels) < desired_hotel_count:
             logging.warning(f"Only {len(top_hotels)} hotels found, adding mock data to reach {desired_hotel_count}")
+            FALLBACKS.labels("mock_hotels").inc(desired_hotel_count - len(top_hotels))
             while len(top_hotels) < desired_hotel_count:
                 top_hotels.append({
                     "name": f"Mock Hotel {len(top_hotels) + 1} in {location}",
@@ -442,17 +408,65 @@ async def search_hotels(location: str, checkin: str, checkout: str):
             if "score" in hotel:
                 del hotel["score"]
 
+        if debug:
+            return {"hotels": top_hotels, "debug": {"timings": request_timings()}}
         return top_hotels
     except Exception as e:
         logging.error(f"Error in /hotels/search: {str(e)}")
         logging.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error searching hotels: {str(e)}")
 
+@app.get("/pois/nearby")
+async def get_nearby_pois(location: str, lat: float = None, lon: float = None, k: int = 10,
+                          radius_km: float = None, interest: str = None, min_score: float = 0.5):
+    """The k POIs of a city nearest to a point (default: the city centre), optionally within radius_km and matching an interest."""
+    city_info = city_coordinates.get(location)
+    if not city_info:
+        raise HTTPException(status_code=400, detail="Unsupported location")
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=400, detail="lat and lon must be given together")
+    if not 1 <= k <= 100:
+        raise HTTPException(status_code=400, detail="k must be between 1 and 100")
+    if radius_km is not None and radius_km <= 0:
+        raise HTTPException(status_code=400, detail="radius_km must be positive")
+    if interest == "ArtAndCulture":
+        interest = "Art & Culture"
+    if interest is not None and interest not in interests:
+        raise HTTPException(status_code=400, detail=f"Invalid interest: {interest}. Must be one of {set(interests)}")
+
+    if lat is None:
+        lat, lon = city_info["lat"], city_info["lon"]
+    catalog = await fetch_poi_catalog(city_info["iata"])
+    pois = nearby_pois(catalog, lat, lon, k=k, radius_km=radius_km, interest=interest, min_score=min_score)
+    return {
+        "location": location,
+        "center": {"lat": lat, "lon": lon},
+        "pois": [
+            {
+                "name": poi["name"],
+                "lat": poi["lat"],
+                "lon": poi["lon"],
+                "interests": poi.get("interests", {}),
+                "distance_km": poi["distance_km"]
+            }
+            for poi in pois
+        ]
+    }
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
-@app.on_event("shutdown")
-def shutdown_event():
-    mongo_client.close()
-    logging.info("MongoDB Atlas connection closed")
\ No newline at end of file
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms, cache, retry, fallback, external error and event loop counters."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/debug/loop-blocks")
+async def loop_blocks(request: Request):
+    """Recent event loop blocks with the stage, blocking function and a stack sample of each; needs PROFILE_TOKEN."""
+    # Stack samples expose code paths, so answer as if the route did not exist without the token
+    if not has_profile_token(request):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return loop_monitor.report()
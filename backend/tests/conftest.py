@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+
+# Tests import the backend modules the same way main.py does, from the backend directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+CITY_CENTER = (48.8566, 2.3522)  # Paris
+
+
+@pytest.fixture
+def city_coords():
+    """Factory for an (n, 2) array of random [lat, lon] points around CITY_CENTER; same seed, same points."""
+    def make(n, seed=0):
+        return np.random.default_rng(seed).normal(CITY_CENTER, 0.05, size=(n, 2))
+    return make
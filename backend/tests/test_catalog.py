@@ -0,0 +1,50 @@
+import asyncio
+import pytest
+import utils
+from components import catalog, repository
+
+
+@pytest.fixture
+def pois_db(monkeypatch):
+    """A stand-in for the pois and poi_versions collections."""
+    db = {"pois": {"PAR": [{"city": "PAR", "name": "Louvre", "interests": {"Art & Culture": 0.9}, "lat": 48.86, "lon": 2.34}]}, "versions": {"PAR": 1}}
+
+    async def find_city_pois(city):
+        return [dict(poi) for poi in db["pois"].get(city, [])]
+
+    async def find_poi_version(city):
+        return db["versions"].get(city, 0)
+
+    monkeypatch.setattr(repository, "find_city_pois", find_city_pois)
+    monkeypatch.setattr(repository, "find_poi_version", find_poi_version)
+    monkeypatch.setattr(catalog, "POI_VERSION_CHECK_SECONDS", 0)
+    catalog.invalidate_catalog()
+    yield db
+    catalog.invalidate_catalog()
+
+
+def test_cached_catalog_is_reused_while_version_unchanged(pois_db):
+    first = asyncio.run(utils.fetch_poi_catalog("PAR"))
+    second = asyncio.run(utils.fetch_poi_catalog("PAR"))
+    assert second is first
+
+
+def test_retag_rebuilds_catalog_on_next_request(pois_db):
+    before = asyncio.run(utils.fetch_poi_catalog("PAR"))
+
+    # What tag_pois_daily.py does: new interests, and the write bumps the city's version
+    pois_db["pois"]["PAR"][0]["interests"] = {"Historical": 0.8}
+    pois_db["versions"]["PAR"] += 1
+
+    after = asyncio.run(utils.fetch_poi_catalog("PAR"))
+    assert after is not before
+    assert after.version != before.version
+    assert after.pois[0]["interests"] == {"Historical": 0.8}
+    assert after.source_version == 2
+
+
+def test_version_is_not_checked_within_interval(pois_db, monkeypatch):
+    monkeypatch.setattr(catalog, "POI_VERSION_CHECK_SECONDS", 3600)
+    before = asyncio.run(utils.fetch_poi_catalog("PAR"))
+    pois_db["versions"]["PAR"] += 1
+    assert asyncio.run(utils.fetch_poi_catalog("PAR")) is before
@@ -0,0 +1,37 @@
+import numpy as np
+from components.clustering import cluster_labels, cluster_pois
+
+
+def test_balanced_clusters_differ_by_at_most_one(city_coords):
+    for n, k in [(10, 3), (23, 4), (50, 7)]:
+        counts = np.bincount(cluster_labels(city_coords(n), k), minlength=k)
+        assert counts.sum() == n
+        assert counts.max() - counts.min() <= 1
+
+
+def test_capacity_is_respected(city_coords):
+    counts = np.bincount(cluster_labels(city_coords(30), 4, capacity=9), minlength=4)
+    assert counts.sum() == 30
+    assert counts.max() <= 9
+
+
+def test_labels_are_deterministic(city_coords):
+    coords = city_coords(40, seed=1)
+    assert np.array_equal(cluster_labels(coords, 5), cluster_labels(coords.copy(), 5))
+
+
+def test_separated_groups_are_kept_together():
+    # Two tight groups far apart must not be mixed
+    rng = np.random.default_rng(2)
+    coords = np.vstack([rng.normal((48.85, 2.35), 0.001, size=(6, 2)), rng.normal((48.95, 2.55), 0.001, size=(6, 2))])
+    labels = cluster_labels(coords, 2)
+    assert len(set(labels[:6].tolist())) == 1
+    assert len(set(labels[6:].tolist())) == 1
+    assert labels[0] != labels[6]
+
+
+def test_cluster_pois_pads_days_and_drops_duplicates():
+    pois = [{"name": f"poi {i}", "lat": 48.85 + i * 0.01, "lon": 2.35} for i in range(2)]
+    clusters = cluster_pois(pois + [dict(pois[0])], days=3)
+    assert len(clusters) == 3
+    assert sorted(poi["name"] for day in clusters for poi in day) == ["poi 0", "poi 1"]
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from components.distance import haversine_distance, haversine_matrix, haversine_condensed, haversine_to_many, k_nearest
+
+
+def test_matrix_matches_scalar_haversine(city_coords):
+    lats, lons = city_coords(15).T
+    expected = [[haversine_distance(a, b, c, d) for c, d in zip(lats.tolist(), lons.tolist())] for a, b in zip(lats.tolist(), lons.tolist())]
+    assert np.allclose(haversine_matrix(lats, lons), expected, rtol=0, atol=1e-9)
+    assert np.allclose(haversine_matrix(lats, lons, dtype=np.float32), expected, rtol=0, atol=1e-3)
+
+
+def test_matrix_is_symmetric_with_zero_diagonal(city_coords):
+    dist = haversine_matrix(*city_coords(20, seed=1).T)
+    assert dist.shape == (20, 20)
+    assert np.array_equal(dist, dist.T)
+    assert not np.diagonal(dist).any()
+
+
+def test_scalar_points(city_coords):
+    lats, lons = city_coords(5, seed=2).T
+    one_to_many = haversine_matrix(lats[0], lons[0], lats, lons)
+    assert one_to_many.shape == (1, 5)
+    assert np.allclose(one_to_many[0], haversine_matrix(lats, lons)[0])
+    # Paris to London, about 344 km
+    assert haversine_matrix(48.8566, 2.3522, 51.5074, -0.1278)[0, 0] == pytest.approx(343.6, abs=0.5)
+
+
+def test_condensed_matches_upper_triangle(city_coords):
+    lats, lons = city_coords(12, seed=3).T
+    i, j = np.triu_indices(12, k=1)
+    assert np.allclose(haversine_condensed(lats, lons), haversine_matrix(lats, lons)[i, j], rtol=0, atol=1e-9)
+    assert haversine_condensed([48.85], [2.35]).shape == (0,)
+
+
+def test_to_many_matches_matrix_row(city_coords):
+    lats, lons = city_coords(10, seed=4).T
+    distances = haversine_to_many(lats[3], lons[3], lats, lons)
+    assert distances.shape == (10,)
+    assert np.allclose(distances, haversine_matrix(lats, lons)[3], rtol=0, atol=1e-9)
+    assert distances[3] == 0
+
+
+def test_k_nearest(city_coords):
+    lats, lons = city_coords(50, seed=5).T
+    expected = haversine_to_many(48.86, 2.35, lats, lons)
+    indices, distances = k_nearest(48.86, 2.35, lats, lons, 5)
+    assert indices.tolist() == np.argsort(expected, kind="stable")[:5].tolist()
+    assert np.array_equal(distances, expected[indices])
+    assert len(k_nearest(48.86, 2.35, lats[:3], lons[:3], 5)[0]) == 3
+    assert len(k_nearest(48.86, 2.35, [], [], 5)[0]) == 0
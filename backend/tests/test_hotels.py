@@ -0,0 +1,53 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+from components import hotels
+from components.cache import LRUCache
+
+
+@pytest.fixture
+def amadeus(monkeypatch):
+    """A stub Hotel Search API with offers for the even-numbered hotels only; records the hotelIds of each call."""
+    calls = []
+
+    def search(hotelIds, **params):
+        calls.append(hotelIds.split(","))
+        data = [{"hotel": {"hotelId": hotel_id}, "offers": [{"price": {"total": "100"}}]}
+                for hotel_id in hotelIds.split(",") if int(hotel_id[1:]) % 2 == 0]
+        return SimpleNamespace(data=data)
+
+    client = SimpleNamespace(shopping=SimpleNamespace(hotel_offers_search=SimpleNamespace(get=search)))
+    monkeypatch.setattr(hotels, "get_amadeus", lambda: client)
+    monkeypatch.setattr(hotels, "hotel_offers_cache", LRUCache(max_bytes=1024 * 1024, ttl=hotels.HOTEL_OFFERS_TTL))
+    return calls
+
+
+def _offers(hotel_ids):
+    return asyncio.run(hotels.get_hotel_offers(hotel_ids, "2026-11-01", "2026-11-03"))
+
+
+def _ids(offers):
+    return [offer["hotel"]["hotelId"] for offer in offers]
+
+
+def test_only_uncached_hotels_are_sent_to_amadeus(amadeus):
+    assert _ids(_offers([f"H{i}" for i in range(6)])) == ["H0", "H2", "H4"]
+    # A 10-ID query overlapping the first: only H6..H9 are new, in reverse order to check the result keeps it
+    second = _offers([f"H{i}" for i in reversed(range(10))])
+    assert amadeus == [[f"H{i}" for i in range(6)], ["H9", "H8", "H7", "H6"]]
+    assert _ids(second) == ["H8", "H6", "H4", "H2", "H0"]
+
+
+def test_hotels_without_offers_are_not_fetched_again_within_ttl(amadeus):
+    _offers(["H1", "H3"])
+    assert _offers(["H1", "H3"]) == []
+    assert amadeus == [["H1", "H3"]]
+
+
+def test_offers_are_fetched_again_after_ttl(amadeus, monkeypatch):
+    monkeypatch.setattr(hotels, "hotel_offers_cache", LRUCache(max_bytes=1024 * 1024, ttl=0.05))
+    _offers(["H1", "H2"])
+    time.sleep(0.1)
+    _offers(["H1", "H2"])
+    assert amadeus == [["H1", "H2"], ["H1", "H2"]]
@@ -0,0 +1,59 @@
+import asyncio
+import time
+import pytest
+import utils
+from components import repository
+
+
+@pytest.fixture
+def leases(monkeypatch):
+    """In-memory ingest_leases with the same owner/expiry semantics as the Mongo version."""
+    held = {}
+
+    async def acquire_ingest_lease(city, owner, ttl):
+        lease = held.get(city)
+        if lease is not None and lease["owner"] != owner and lease["expires_at"] > time.monotonic():
+            return False
+        held[city] = {"owner": owner, "expires_at": time.monotonic() + ttl}
+        return True
+
+    async def release_ingest_lease(city, owner):
+        if held.get(city, {}).get("owner") == owner:
+            del held[city]
+
+    monkeypatch.setattr(repository, "acquire_ingest_lease", acquire_ingest_lease)
+    monkeypatch.setattr(repository, "release_ingest_lease", release_ingest_lease)
+    monkeypatch.setattr(utils, "POI_INGEST_LEASE_SECONDS", 0.3)
+    return held
+
+
+def test_lease_is_renewed_while_ingestion_outlives_ttl(leases, monkeypatch):
+    stored = []
+
+    async def find_stored_pois(city):
+        return list(stored)
+
+    async def slow_ingest(city):
+        await asyncio.sleep(1.0)  # more than three lease TTLs
+        stored.append({"name": "Louvre"})
+        return list(stored)
+
+    monkeypatch.setattr(utils, "find_stored_pois", find_stored_pois)
+    monkeypatch.setattr(utils, "fetch_and_store_city_pois", slow_ingest)
+
+    async def other_worker():
+        # Another process trying to take the lease for the whole duration
+        taken = []
+        for _ in range(9):
+            await asyncio.sleep(0.1)
+            taken.append(await repository.acquire_ingest_lease("PAR", "other-worker", 0.3))
+        return taken
+
+    async def run():
+        return await asyncio.gather(utils._ingest_with_lease("PAR"), other_worker())
+
+    pois, taken = asyncio.run(run())
+    assert pois == [{"name": "Louvre"}]
+    assert not any(taken)
+    assert "PAR" not in leases  # released after the ingestion
+
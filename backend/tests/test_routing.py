@@ -0,0 +1,50 @@
+import itertools
+import numpy as np
+from components.distance import haversine_matrix
+from components.routing import order_route, day_order, _nearest_neighbour
+
+
+def _length(dist, path):
+    return sum(dist[a, b] for a, b in zip(path, path[1:]))
+
+
+def _shortest_length(dist, start=None):
+    """Length of the shortest open path, by trying every order."""
+    nodes = range(len(dist))
+    if start is None:
+        paths = itertools.permutations(nodes)
+    else:
+        paths = ((start,) + rest for rest in itertools.permutations([i for i in nodes if i != start]))
+    return min(_length(dist, path) for path in paths)
+
+
+def test_order_route_is_a_permutation_with_fixed_start(city_coords):
+    dist = haversine_matrix(*city_coords(12).T)
+    for start in (None, 0, 5):
+        path = order_route(dist, start=start)
+        assert sorted(path) == list(range(12))
+        if start is not None:
+            assert path[0] == start
+
+
+def test_order_route_beats_nearest_neighbour_and_is_near_optimal(city_coords):
+    # 2-opt only finds a local optimum, so allow some slack against the shortest path
+    for seed in range(10):
+        dist = haversine_matrix(*city_coords(7, seed).T)
+        for start in (None, 0):
+            length = _length(dist, order_route(dist, start=start))
+            nearest = _nearest_neighbour(dist, range(7) if start is None else [start])
+            assert length <= min(_length(dist, path) for path in nearest) + 1e-9
+            assert length <= _shortest_length(dist, start=start) * 1.2
+
+
+def test_points_on_a_line_are_visited_in_order():
+    lats = np.array([48.80, 48.84, 48.81, 48.83, 48.82])
+    order = day_order(lats, np.full(5, 2.35), start=(48.79, 2.35))
+    assert order == [0, 2, 4, 3, 1]
+
+
+def test_tiny_routes():
+    assert order_route(np.zeros((0, 0))) == []
+    assert order_route(np.zeros((1, 1))) == [0]
+    assert order_route(np.array([[0.0, 1.0], [1.0, 0.0]]), start=1) == [1, 0]
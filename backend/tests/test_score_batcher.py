@@ -0,0 +1,80 @@
+import asyncio
+import numpy as np
+import pytest
+from components import score_batcher
+from components.catalog import POICatalog
+from components.score_batcher import ScoreBatcher
+from components.scoring import rank_pois
+from data.interests import interests
+
+
+@pytest.fixture
+def catalog():
+    rng = np.random.default_rng(0)
+    pois = [
+        {"name": f"poi {i}", "lat": 48.85, "lon": 2.35, "interests": {interest: float(rng.random()) for interest in rng.choice(interests, 4, replace=False)}}
+        for i in range(200)
+    ]
+    return POICatalog("PAR", pois)
+
+
+@pytest.fixture
+def batch_sizes(monkeypatch):
+    """Records the number of requests each batch scores."""
+    sizes = []
+    rank_pois_many = score_batcher.rank_pois_many
+
+    def recording(matrix, norms, user_vectors, **kwargs):
+        sizes.append(len(user_vectors))
+        return rank_pois_many(matrix, norms, user_vectors, **kwargs)
+
+    monkeypatch.setattr(score_batcher, "rank_pois_many", recording)
+    return sizes
+
+
+def _user_vectors(n):
+    return np.random.default_rng(1).random((n, len(interests))).astype(np.float32)
+
+
+def test_batched_results_match_per_request_ranking(catalog, batch_sizes):
+    batcher = ScoreBatcher(window=0.005, max_size=8)
+    vectors = _user_vectors(20)
+
+    async def rank_all():
+        return await asyncio.gather(*(batcher.rank(catalog, vector, 0.3) for vector in vectors))
+
+    results = asyncio.run(rank_all())
+    # Two batches flush early at max_size, the rest when the window closes
+    assert batch_sizes == [8, 8, 4]
+    scorer = catalog.scorer
+    for vector, (indices, sims) in zip(vectors, results):
+        expected_indices, expected_sims = rank_pois(scorer.matrix, scorer.norms, vector, threshold=0.3)
+        assert np.array_equal(indices, expected_indices)
+        # The matrix-matrix product may round the last float32 bit differently
+        assert np.allclose(sims, expected_sims, rtol=1e-6, atol=0)
+
+
+def test_requests_for_other_thresholds_are_not_batched_together(catalog, batch_sizes):
+    batcher = ScoreBatcher(window=0.005, max_size=8)
+    vectors = _user_vectors(4)
+
+    async def rank_all():
+        return await asyncio.gather(*(batcher.rank(catalog, vector, 0.3 if i % 2 else 0.5) for i, vector in enumerate(vectors)))
+
+    asyncio.run(rank_all())
+    assert batch_sizes == [2, 2]
+
+
+def test_batch_failure_reaches_every_waiter(catalog, monkeypatch):
+    def failing(*args, **kwargs):
+        raise RuntimeError("scoring failed")
+
+    monkeypatch.setattr(score_batcher, "rank_pois_many", failing)
+    batcher = ScoreBatcher(window=0.005, max_size=8)
+
+    async def rank_all():
+        return await asyncio.gather(*(batcher.rank(catalog, vector, 0.3) for vector in _user_vectors(5)), return_exceptions=True)
+
+    results = asyncio.run(rank_all())
+    assert len(results) == 5
+    assert all(isinstance(result, RuntimeError) for result in results)
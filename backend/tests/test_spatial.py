@@ -0,0 +1,43 @@
+import numpy as np
+from components.distance import haversine_to_many
+from components.spatial import SpatialIndex
+
+
+def test_k_nearest_matches_brute_force(city_coords):
+    coords = city_coords(300)
+    index = SpatialIndex(coords[:, 0], coords[:, 1], cell_km=0.5)
+    for lat, lon in city_coords(20, seed=1):
+        expected = haversine_to_many(lat, lon, coords[:, 0], coords[:, 1])
+        indices, distances = index.query(lat, lon, k=10)
+        assert indices.tolist() == np.argsort(expected, kind="stable")[:10].tolist()
+        assert np.allclose(distances, expected[indices], rtol=0, atol=1e-6)
+
+
+def test_radius_query_matches_brute_force(city_coords):
+    coords = city_coords(300, seed=2)
+    index = SpatialIndex(coords[:, 0], coords[:, 1])
+    lat, lon = 48.86, 2.35
+    expected = haversine_to_many(lat, lon, coords[:, 0], coords[:, 1])
+    indices, distances = index.query(lat, lon, radius_km=2.0)
+    assert sorted(indices.tolist()) == np.flatnonzero(expected <= 2.0).tolist()
+    assert np.all(np.diff(distances) >= 0)
+
+
+def test_mask_restricts_results(city_coords):
+    coords = city_coords(200, seed=3)
+    index = SpatialIndex(coords[:, 0], coords[:, 1])
+    mask = np.arange(200) % 3 == 0
+    lat, lon = 48.85, 2.36
+    expected = np.where(mask, haversine_to_many(lat, lon, coords[:, 0], coords[:, 1]), np.inf)
+    indices, _ = index.query(lat, lon, k=5, mask=mask)
+    assert indices.tolist() == np.argsort(expected, kind="stable")[:5].tolist()
+    indices, _ = index.query(lat, lon, k=5, radius_km=1.0, mask=mask)
+    assert mask[indices].all()
+
+
+def test_far_and_empty_queries(city_coords):
+    coords = city_coords(50, seed=4)
+    index = SpatialIndex(coords[:, 0], coords[:, 1])
+    assert len(index.query(40.0, -74.0, radius_km=5.0)[0]) == 0
+    assert len(index.query(40.0, -74.0, k=3)[0]) == 3  # k nearest falls back to the whole city
+    assert len(SpatialIndex([], []).query(48.85, 2.35, k=3)[0]) == 0
@@ -0,0 +1,10 @@
+from components.stream_parser import IncrementalPlanParser
+
+
+def test_days_keep_their_array_index_after_an_unparseable_day():
+    text = '```json\n{"plan": [{"day": 1, "a": "x"}, {"day": 2, "a": x}, {"day": 3, "a": "z"}], "Hotel": "H"}\n```'
+    parser = IncrementalPlanParser()
+    days = []
+    for start in range(0, len(text), 7):  # split mid-token, like a real stream
+        days.extend(parser.feed(text[start:start + 7]))
+    assert days == [(0, {"day": 1, "a": "x"}), (2, {"day": 3, "a": "z"})]
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from components import tagging
+from components.tagging import AdaptiveBatcher, IncompleteResponseError
+
+
+def pois(n, name_length=10):
+    return [{"name": f"{i:03d}" + "x" * name_length, "category": "MUSEUM"} for i in range(n)]
+
+
+def test_batches_respect_prompt_and_response_budget():
+    batcher = AdaptiveBatcher(max_batch_size=100, token_budget=4000)
+    items = pois(30, name_length=200)
+    batches = batcher.make_batches(items, "model", max_output_tokens=100000)
+    assert [poi for batch in batches for poi in batch] == items
+    for batch in batches:
+        prompt = tagging._tokens(tagging._batch_prompt(batch))
+        response = sum(batcher.estimate_response_tokens(poi) for poi in batch)
+        assert len(batch) == 1 or prompt + response <= 4000 * tagging.OUTPUT_TOKEN_SAFETY
+
+
+@pytest.fixture
+def fresh_batcher(monkeypatch):
+    batcher = AdaptiveBatcher(max_batch_size=8)
+    monkeypatch.setattr(tagging, "batcher", batcher)
+    return batcher
+
+
+def test_rate_errors_do_not_shrink_batches(fresh_batcher, monkeypatch):
+    calls = []
+
+    async def request(batch, batch_no, max_output_tokens):
+        calls.append(len(batch))
+        raise RuntimeError("429 Resource has been exhausted")
+
+    monkeypatch.setattr(tagging, "_request_batch_tags", request)
+    result = asyncio.run(tagging._tag_batch(pois(8), "1", retries=2, delay=0.001, max_output_tokens=4000))
+    assert fresh_batcher.batch_size_for(tagging.TAGGING_MODEL) == 8
+    assert calls == [8, 8]  # retried, but not split into more requests
+    assert result == [tagging.fallback_mapping["MUSEUM"]] * 8
+
+
+def test_truncated_responses_shrink_and_split(fresh_batcher, monkeypatch):
+    async def request(batch, batch_no, max_output_tokens):
+        if len(batch) > 4:
+            raise IncompleteResponseError("truncated")
+        return [{"Historical": 0.9}] * len(batch)
+
+    monkeypatch.setattr(tagging, "_request_batch_tags", request)
+    result = asyncio.run(tagging._tag_batch(pois(8), "1", retries=2, delay=0.001, max_output_tokens=4000))
+    assert result == [{"Historical": 0.9}] * 8
+    assert fresh_batcher.batch_size_for(tagging.TAGGING_MODEL) < 8
@@ -1,65 +1,41 @@
 # backend/utils.py
 import os
-from openai import OpenAI
-import google.generativeai as genai
-from data.interests import interests
+import asyncio
+import socket
+import time
+import uuid
 from data.cities import city_coordinates
-from dotenv import load_dotenv
-from pathlib import Path
-import json
-import pymongo
+from components.catalog import POICatalog, get_cached_catalog, cache_catalog, invalidate_catalog, needs_version_check
+from components import repository
+from components import http_client
+from components.tagging import tag_pois_with_interests, fallback_interests
+from components.metrics import stage_timer, FALLBACKS, EXTERNAL_ERRORS
 import logging
-import time
-import requests
+import httpx
 from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Load environment variables
-env_path = Path(__file__).parent / ".env"
-load_dotenv(env_path)
-logging.info(f"Loaded .env from: {env_path}")
-logging.info(f"OPENAI_API_KEY from utils.py: {os.getenv('OPENAI_API_KEY')}")
-logging.info(f"GEMINI_API_KEY from utils.py: {os.getenv('GEMINI_API_KEY')}")
-logging.info(f"MONGO_URI from utils.py: {os.getenv('MONGO_URI')}")
-logging.info(f"HERE_API_KEY from utils.py: {os.getenv('HERE_API_KEY')}")
-
-# Get HERE API key
+# Get HERE API key (only needed to ingest cities that are not in MongoDB yet)
 HERE_API_KEY = os.getenv("HERE_API_KEY")
 if not HERE_API_KEY:
-    raise ValueError("HERE_API_KEY environment variable not set")
-
-# Initialize OpenAI client (not used for now)
-openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-# Initialize Gemini client
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-
-# Initialize MongoDB client
-mongo_client = pymongo.MongoClient(os.getenv("MONGO_URI"))
-db = mongo_client["trip_planner"]
-
-# Test MongoDB connection
-try:
-    mongo_client.server_info()
-    logging.info("MongoDB Atlas connection successful")
-except Exception as e:
-    logging.error(f"MongoDB Atlas connection failed: {str(e)}")
-    raise
+    logging.warning("HERE_API_KEY environment variable not set, new cities cannot be ingested")
 
 # Map IATA codes to city names, derived from city_coordinates
 iata_to_city = {info["iata"]: city for city, info in city_coordinates.items()}
 
+# Cold-city ingestion runs once per city: concurrent callers in this process share
+# one task, and a Mongo lease keeps other workers polling instead of ingesting too.
+# The holder renews the lease every third of its TTL while it works, so a crashed
+# holder is replaced within one TTL however long a live ingestion takes.
+POI_INGEST_LEASE_SECONDS = float(os.getenv("POI_INGEST_LEASE_SECONDS", 30))
+POI_INGEST_MAX_SECONDS = float(os.getenv("POI_INGEST_MAX_SECONDS", 900))
+POI_INGEST_POLL_SECONDS = float(os.getenv("POI_INGEST_POLL_SECONDS", 1))
+INGEST_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_city_ingestions = {}  # city IATA -> in-flight ingestion task
 
-def clean_gemini_response(response_text: str) -> str:
-    """Clean Gemini response by removing Markdown code block formatting."""
-    cleaned = response_text.strip()
-    if cleaned.startswith("```json"):
-        cleaned = cleaned[len("```json"):].strip()
-    if cleaned.endswith("```"):
-        cleaned = cleaned[:-len("```")].strip()
-    return cleaned
 
 async def fetch_city_coordinates(city_name: str):
     """Fetch city coordinates using HERE Geocoding API, with fallback to hardcoded data."""
@@ -70,7 +46,8 @@ async def fetch_city_coordinates(city_name: str):
             "apiKey": HERE_API_KEY
         }
         
-        response = requests.get(url, params=params)
+        with stage_timer("here_geocode"):
+            response = await http_client.get(url, params=params)
         if response.status_code != 200:
             raise HTTPException(status_code=500, detail=f"Failed to fetch city coordinates: {response.text}")
         
@@ -88,30 +65,145 @@ async def fetch_city_coordinates(city_name: str):
         }
     except Exception as e:
         logging.warning(f"Failed to fetch city coordinates from HERE API: {str(e)}. Falling back to hardcoded data.")
+        EXTERNAL_ERRORS.labels("here").inc()
+        FALLBACKS.labels("city_coordinates").inc()
         # Fallback to hardcoded data
         city_info = next((info for city, info in city_coordinates.items() if city.lower() == city_name.lower()), None)
         if not city_info:
             raise HTTPException(status_code=400, detail=f"Unsupported location: {city_name}")
         return city_info
 
+async def fetch_poi_catalog(city_iata: str) -> POICatalog:
+    """Return a city's POI catalog, served from the in-process cache when possible."""
+    with stage_timer("fetch_pois"):
+        catalog = get_cached_catalog(city_iata)
+        if catalog is not None and not await catalog_is_stale(catalog):
+            logging.info(f"POI catalog cache hit for {city_iata} ({len(catalog)} POIs, version {catalog.version})")
+            return catalog
+
+        logging.info(f"POI catalog cache miss for {city_iata}")
+        # Read the counter before the POIs, so a write in between causes a reload rather than staleness
+        source_version = await repository.find_poi_version(city_iata)
+        pois = await load_city_pois(city_iata)
+        if not pois:
+            return POICatalog(city_iata, [])
+        return cache_catalog(city_iata, pois, source_version)
+
+async def catalog_is_stale(catalog: POICatalog) -> bool:
+    """Whether the city's POIs changed in MongoDB since the catalog was built; checked at most every POI_VERSION_CHECK_SECONDS."""
+    if not needs_version_check(catalog):
+        return False
+    try:
+        version = await repository.find_poi_version(catalog.city)
+    except Exception as e:
+        logging.warning(f"Could not check the POI version for {catalog.city}, serving the cached catalog: {str(e)}")
+        return False
+    catalog.checked_at = time.monotonic()
+    if version == catalog.source_version:
+        return False
+    logging.info(f"POIs for {catalog.city} changed (version {catalog.source_version} -> {version}), rebuilding the catalog")
+    invalidate_catalog(catalog.city)
+    return True
+
 async def fetch_pois(city_iata: str):
-    """Fetch POIs for a city using HERE API, tag them with interests, and cache in MongoDB."""
+    """Fetch the de-duplicated POIs for a city."""
+    catalog = await fetch_poi_catalog(city_iata)
+    return catalog.pois
+
+async def find_stored_pois(city_iata: str) -> list:
+    """The de-duplicated POIs stored in MongoDB for a city (empty if it was never ingested)."""
     logging.info(f"Fetching POIs for city IATA: {city_iata} from MongoDB Atlas")
-    pois = list(db.pois.find({"city": city_iata}))
+    with stage_timer("mongo_find_pois"):
+        pois = await repository.find_city_pois(city_iata)
+    # Remove duplicates based on POI name
+    seen_names = set()
+    unique_pois = []
+    for poi in pois:
+        if poi["name"] not in seen_names:
+            seen_names.add(poi["name"])
+            unique_pois.append(poi)
+        else:
+            logging.warning(f"Duplicate POI found in database for {city_iata}: {poi['name']}")
+    if unique_pois:
+        logging.info(f"Found {len(unique_pois)} POIs in MongoDB Atlas for {city_iata} (after deduplication)")
+    return unique_pois
+
+async def load_city_pois(city_iata: str):
+    """Fetch POIs for a city from MongoDB, ingesting them from the HERE API the first time."""
+    pois = await find_stored_pois(city_iata)
     if pois:
-        # Remove duplicates based on POI name
-        seen_names = set()
-        unique_pois = []
-        for poi in pois:
-            if poi["name"] not in seen_names:
-                seen_names.add(poi["name"])
-                unique_pois.append(poi)
-            else:
-                logging.warning(f"Duplicate POI found in database for {city_iata}: {poi['name']}")
-        logging.info(f"Found POIs in MongoDB Atlas for {city_iata} (after deduplication): {unique_pois}")
-        return unique_pois
+        return pois
+
+    logging.info(f"No POIs found in MongoDB Atlas for {city_iata}, ingesting from HERE API")
+    return await ingest_city_pois(city_iata)
+
+async def ingest_city_pois(city_iata: str):
+    """Ingest a city's POIs, or join the ingestion already running for it in this process."""
+    task = _city_ingestions.get(city_iata)
+    if task is None:
+        task = asyncio.create_task(_ingest_with_lease(city_iata))
+        _city_ingestions[city_iata] = task
 
-    logging.info(f"No POIs found in MongoDB Atlas for {city_iata}, fetching from HERE API")
+        def done(task):
+            _city_ingestions.pop(city_iata, None)
+            if not task.cancelled() and task.exception() is not None:
+                logging.error(f"POI ingestion for {city_iata} failed: {task.exception()}")
+
+        task.add_done_callback(done)
+    else:
+        logging.info(f"Joining in-flight POI ingestion for {city_iata}")
+    # Shielded so a cancelled request does not abort the ingestion other callers wait on
+    return await asyncio.shield(task)
+
+async def _ingest_with_lease(city_iata: str):
+    """
+    Ingest under the city's Mongo lease, or wait for the worker holding it to store the POIs.
+
+    Waiters keep waiting while the holder keeps renewing the lease. If the holder
+    dies its lease expires and a waiter takes over; if it fails it releases the
+    lease and the next waiter tries itself.
+    """
+    while True:
+        if await repository.acquire_ingest_lease(city_iata, INGEST_OWNER, POI_INGEST_LEASE_SECONDS):
+            renewal = asyncio.create_task(_renew_ingest_lease(city_iata))
+            try:
+                # Another worker may have finished between our first read and taking the lease
+                pois = await find_stored_pois(city_iata)
+                if pois:
+                    return pois
+                return await asyncio.wait_for(fetch_and_store_city_pois(city_iata), POI_INGEST_MAX_SECONDS)
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=503, detail=f"Ingesting POIs for {city_iata} took too long, try again shortly")
+            finally:
+                renewal.cancel()
+                try:
+                    # Only deletes the lease while we still own it, never one another worker took over
+                    await repository.release_ingest_lease(city_iata, INGEST_OWNER)
+                except Exception as e:
+                    logging.error(f"Failed to release ingestion lease for {city_iata}: {str(e)}")
+
+        logging.info(f"Another worker is ingesting POIs for {city_iata}, waiting for it")
+        await asyncio.sleep(POI_INGEST_POLL_SECONDS)
+        pois = await find_stored_pois(city_iata)
+        if pois:
+            return pois
+
+async def _renew_ingest_lease(city_iata: str):
+    """Keep extending our ingestion lease until cancelled."""
+    while True:
+        await asyncio.sleep(POI_INGEST_LEASE_SECONDS / 3)
+        try:
+            if not await repository.acquire_ingest_lease(city_iata, INGEST_OWNER, POI_INGEST_LEASE_SECONDS):
+                logging.error(f"Lost the ingestion lease for {city_iata} to another worker")
+                return
+        except Exception as e:
+            # The next renewal may still land before the lease expires
+            logging.warning(f"Failed to renew the ingestion lease for {city_iata}: {str(e)}")
+
+async def fetch_and_store_city_pois(city_iata: str):
+    """Fetch POIs for a city using HERE API, tag them with interests, and cache in MongoDB."""
+    if not HERE_API_KEY:
+        raise HTTPException(status_code=500, detail="HERE_API_KEY environment variable not set")
     city_name = iata_to_city.get(city_iata)
     if not city_name:
         logging.error(f"No city name found for IATA code {city_iata}")
@@ -130,8 +222,14 @@ async def fetch_pois(city_iata: str):
         "apiKey": HERE_API_KEY
     }
     
-    response = requests.get(url, params=params)
+    try:
+        with stage_timer("here_discover"):
+            response = await http_client.get(url, params=params)
+    except httpx.HTTPError as e:
+        EXTERNAL_ERRORS.labels("here").inc()
+        raise HTTPException(status_code=500, detail=f"Failed to fetch POIs from HERE API: {str(e)}")
     if response.status_code != 200:
+        EXTERNAL_ERRORS.labels("here").inc()
         raise HTTPException(status_code=500, detail=f"Failed to fetch POIs from HERE API: {response.text}")
     
     data = response.json()
@@ -182,28 +280,12 @@ async def fetch_pois(city_iata: str):
 
     # Tag POIs with interests using Gemini
     pois_to_tag = [{"name": poi["name"], "category": poi["category"]} for poi in pois_data]
-    interests_dicts = await tag_pois_with_interests(pois_to_tag)
+    with stage_timer("gemini_tagging"):
+        interests_dicts = await tag_pois_with_interests(pois_to_tag)
 
     if not interests_dicts:
         logging.error(f"Failed to tag POIs for {city_name}. Using fallback interests.")
-        interests_dicts = []
-        for poi in pois_data:
-            category = poi.get("category", "SIGHTSEEING")
-            fallback_mapping = {
-                "SIGHTSEEING": {"Historical": 0.8, "Art & Culture": 0.6},
-                "MUSEUM": {"Historical": 0.8, "Art & Culture": 0.8},
-                "PARK": {"Nature": 0.8, "Relaxing": 0.6},
-                "SHOPPING": {"Shopping": 0.8},
-                "ENTERTAINMENT": {"Entertainment": 0.8},
-                "BEACH": {"Nature": 0.8, "Relaxing": 0.7},
-                "SPORT": {"Sports": 0.8},
-                "ADVENTURE": {"Adventure": 0.8},
-                "HISTORIC": {"Historical": 0.9, "Art & Culture": 0.5},
-                "LANDMARK": {"Historical": 0.8, "Art & Culture": 0.6},
-                "MONUMENT": {"Historical": 0.9, "Art & Culture": 0.4}
-            }
-            fallback_interests = fallback_mapping.get(category, {"Entertainment": 0.5})
-            interests_dicts.append(fallback_interests)
+        interests_dicts = [fallback_interests(poi.get("category", "SIGHTSEEING")) for poi in pois_data]
 
     # Format POIs for storage
     formatted_pois = []
@@ -221,145 +303,13 @@ async def fetch_pois(city_iata: str):
     # Store in MongoDB
     if formatted_pois:
         try:
-            db.pois.insert_many(formatted_pois)
+            with stage_timer("mongo_insert_pois"):
+                await repository.insert_pois(formatted_pois)
             logging.info(f"Stored tagged POIs for {city_iata} in MongoDB Atlas")
+        except BulkWriteError as e:
+            inserted = e.details.get("nInserted", 0)
+            logging.warning(f"Stored {inserted} of {len(formatted_pois)} POIs for {city_iata}, the rest were rejected (usually duplicates): {str(e)}")
         except Exception as e:
             logging.error(f"Error storing POIs for {city_iata} in MongoDB Atlas: {str(e)}")
 
     return formatted_pois
-
-async def tag_pois_with_interests(pois: list, retries=3, delay=5, max_output_tokens=4000):
-    batch_size = 10
-    interests_dicts = []
-    
-    for i in range(0, len(pois), batch_size):
-        batch = pois[i:i + batch_size]
-        logging.info(f"Processing batch {i//batch_size + 1} with {len(batch)} POIs")
-        
-        for attempt in range(retries):
-            try:
-                model = genai.GenerativeModel("gemini-1.5-flash")
-                prompt = (
-                    "Classify the following points of interest into one or more of these interests: "
-                    f"{', '.join(interests)}. Assign a score between 0 and 1 for each interest based on relevance. "
-                    "Return the result as a JSON array where each element is an object with 'name', 'category', and 'interests' (a dictionary of interest names and scores).\n"
-                )
-                for poi in batch:
-                    prompt += f"- Name: {poi['name']}, Category: {poi['category']}\n"
-                
-                logging.info(f"Gemini prompt for batch tagging (batch {i//batch_size + 1}): {prompt}")
-                response = model.generate_content(
-                    prompt,
-                    generation_config={
-                        "max_output_tokens": max_output_tokens,
-                        "temperature": 0.5
-                    }
-                )
-                time.sleep(delay)
-                result = response.text
-                logging.info(f"Gemini response for batch tagging (raw, batch {i//batch_size + 1}): {result}")
-                
-                cleaned_result = clean_gemini_response(result)
-                logging.info(f"Gemini response for batch tagging (cleaned, batch {i//batch_size + 1}): {cleaned_result}")
-                
-                if not cleaned_result or not (cleaned_result.strip().startswith("[") and cleaned_result.strip().endswith("]")):
-                    logging.warning(f"Incomplete Gemini response for batch {i//batch_size + 1}: {cleaned_result}")
-                    raise ValueError("Gemini response is incomplete or not a JSON array")
-                
-                try:
-                    tagged_pois = json.loads(cleaned_result)
-                except json.JSONDecodeError as e:
-                    logging.error(f"Failed to parse Gemini response as JSON (batch {i//batch_size + 1}): {cleaned_result}")
-                    raise ValueError(f"Invalid JSON response from Gemini: {str(e)}")
-                
-                if len(tagged_pois) != len(batch):
-                    logging.warning(f"Expected {len(batch)} POIs in response, but got {len(tagged_pois)}: {tagged_pois}")
-                    raise ValueError("Incomplete response: Number of tagged POIs does not match batch size")
-                
-                for tagged_poi in tagged_pois:
-                    if "name" not in tagged_poi or "category" not in tagged_poi or "interests" not in tagged_poi:
-                        logging.error(f"Invalid tagged POI in batch {i//batch_size + 1}: {tagged_poi}")
-                        raise ValueError("Tagged POI missing required fields")
-                    
-                    raw_interests = tagged_poi.get("interests", {})
-                    normalized_interests = {}
-                    for interest, score in raw_interests.items():
-                        normalized_interest = interest.replace("ArtAndCulture", "Art & Culture")
-                        if normalized_interest in interests:
-                            normalized_interests[normalized_interest] = max(0.0, min(1.0, float(score)))
-                    interests_dicts.append(normalized_interests)
-                break
-            except Exception as e:
-                logging.error(f"Error batch tagging POIs (batch {i//batch_size + 1}, attempt {attempt + 1}/{retries}): {str(e)}")
-                if attempt == retries - 1:
-                    logging.warning(f"Max retries reached for batch {i//batch_size + 1}, falling back to individual tagging")
-                    for poi in batch:
-                        logging.info(f"Falling back to individual tagging for POI: {poi['name']}")
-                        interests_dict = await tag_poi_with_interests(poi["name"], poi["category"], retries=retries, delay=delay)
-                        interests_dicts.append(interests_dict)
-                        time.sleep(delay)
-                else:
-                    time.sleep(delay * (attempt + 1))
-    return interests_dicts
-
-async def tag_poi_with_interests(poi_name: str, category: str, retries=3, delay=15, max_output_tokens=400):
-    for attempt in range(retries):
-        try:
-            model = genai.GenerativeModel("gemini-1.5-flash")
-            prompt = (
-                f"Given the point of interest '{poi_name}' with category '{category}', classify it into one or more of these interests: "
-                f"{', '.join(interests)}. Assign a score between 0 and 1 for each interest based on relevance. "
-                f"Return the result as a JSON object with interest names as keys and scores as values."
-            )
-            logging.info(f"Gemini prompt for individual tagging of '{poi_name}': {prompt}")
-            response = model.generate_content(
-                prompt,
-                generation_config={
-                    "max_output_tokens": max_output_tokens,
-                    "temperature": 0.5
-                }
-            )
-            time.sleep(delay)
-            result = response.text
-            logging.info(f"Gemini response for individual tagging of '{poi_name}' (raw): {result}")
-            
-            cleaned_result = clean_gemini_response(result)
-            logging.info(f"Gemini response for individual tagging of '{poi_name}' (cleaned): {cleaned_result}")
-            
-            if not cleaned_result or not (cleaned_result.strip().startswith("{") and cleaned_result.strip().endswith("}")):
-                logging.warning(f"Incomplete Gemini response for '{poi_name}': {cleaned_result}")
-                raise ValueError("Gemini response is incomplete or not a JSON object")
-            
-            try:
-                interests_dict = json.loads(cleaned_result)
-            except json.JSONDecodeError as e:
-                logging.error(f"Failed to parse Gemini response as JSON for '{poi_name}': {cleaned_result}")
-                raise ValueError(f"Invalid JSON response from Gemini: {str(e)}")
-            
-            normalized_interests = {}
-            for interest, score in interests_dict.items():
-                normalized_interest = interest.replace("ArtAndCulture", "Art & Culture")
-                if normalized_interest in interests:
-                    normalized_interests[normalized_interest] = max(0.0, min(1.0, float(score)))
-            return normalized_interests
-        except Exception as e:
-            logging.error(f"Error tagging POI '{poi_name}' with Gemini (attempt {attempt + 1}/{retries}): {str(e)}")
-            if attempt == retries - 1:
-                logging.warning(f"Max retries reached for POI '{poi_name}', using fallback")
-                fallback_mapping = {
-                    "SIGHTSEEING": {"Historical": 0.8, "Art & Culture": 0.6},
-                    "MUSEUM": {"Historical": 0.8, "Art & Culture": 0.8},
-                    "PARK": {"Nature": 0.8, "Relaxing": 0.6},
-                    "SHOPPING": {"Shopping": 0.8},
-                    "ENTERTAINMENT": {"Entertainment": 0.8},
-                    "BEACH": {"Nature": 0.8, "Relaxing": 0.7},
-                    "SPORT": {"Sports": 0.8},
-                    "ADVENTURE": {"Adventure": 0.8},
-                    "HISTORIC": {"Historical": 0.9, "Art & Culture": 0.5},
-                    "LANDMARK": {"Historical": 0.8, "Art & Culture": 0.6},
-                    "MONUMENT": {"Historical": 0.9, "Art & Culture": 0.4}
-                }
-                fallback_interests = fallback_mapping.get(category, {"Entertainment": 0.5})
-                logging.info(f"Fallback interests for POI '{poi_name}' (category: {category}): {fallback_interests}")
-                return fallback_interests
-            time.sleep(delay * (attempt + 1))
\ No newline at end of file